@@ -1,19 +1,19 @@
-from functools import partial
+from math import sqrt
 from enum import Enum
-from heapq import heappush, heappop
-from collections import defaultdict
 from logging import Logger, getLogger
-from copy import deepcopy
+from weakref import WeakValueDictionary
+from itertools import accumulate
 from functools import total_ordering, lru_cache
 from typing import (
     List,
     Dict,
     ClassVar,
-    Generator,
+    Iterator,
     Tuple,
     Optional,
     Union,
     Iterable,
+    Sequence,
     Set,
 )
 
@@ -28,7 +28,6 @@ from ah.protobuf.item_db_pb2 import (
 from ah.storage import BinaryFile
 from ah.models.base import (
     _RootDictMixin,
-    _RootListMixin,
     ConverterWrapper as CW,
 )
 from ah.models.blizzard import (
@@ -174,7 +173,10 @@ class DBFileName:
         return f"{self.SEP.join(parts)}{self.SEP_EXT}{self.ext}"
 
     @classmethod
+    @lru_cache(4096)
     def from_str(cls, name: str) -> "DBFileName":
+        # frozen, so a parsed name can be shared by everyone asking for it again,
+        # e.g. `DB.list_file` over the same directory.
         name, ext = name.split(cls.SEP_EXT)
         parts = name.split(cls.SEP)
         # possible parts:
@@ -227,6 +229,22 @@ class MarketValueRecord:
         default=None, converter=CW.optional(np.int64)
     )
 
+    @classmethod
+    def _from_converted(
+        cls,
+        timestamp: np.int32,
+        market_value: Optional[np.int64],
+        num_auctions: np.int32,
+        min_buyout: Optional[np.int64],
+    ) -> "MarketValueRecord":
+        """skip the converters, values must already be of the field types"""
+        o = object.__new__(cls)
+        object.__setattr__(o, "timestamp", timestamp)
+        object.__setattr__(o, "market_value", market_value)
+        object.__setattr__(o, "num_auctions", num_auctions)
+        object.__setattr__(o, "min_buyout", min_buyout)
+        return o
+
     def __eq__(self, other):
         return self.timestamp == other.timestamp
 
@@ -235,18 +253,46 @@ class MarketValueRecord:
 
 
 @define(kw_only=True)
-class MarketValueRecords(_RootListMixin[MarketValueRecord]):
+class MarketValueRecords:
     """
-    Holds an list of MarketValueRecord, ordered by timestamp in ascending order.
+    Holds MarketValueRecord(s) ordered by timestamp in ascending order. Records
+    are stored column-wise, each record is one row across the columns:
+
+    >>> market_value_records = {
+            # timestamp, int64
+            "_ts": [1234567890, ...],
+            # market value, float64, NaN if None
+            "_mv": [10000, ...],
+            # number of auctions, int32
+            "_na": [100, ...],
+            # min buyout, float64, NaN if None
+            "_mb": [1000, ...],
+        }
 
-    >>> market_value_records = [
-            $market_value_record,
-            ...
-        ]
+    Columns are over-allocated so `add` is amortized O(1), only the first
+    `len(self)` rows are valid. `MarketValueRecord` instances are created on the
+    fly by indexing or iterating, modifying them won't change the stored records.
     """
 
     _logger: ClassVar[Logger] = getLogger("MarketValueRecords")
-    __root__: List[MarketValueRecord] = field(default=Factory(list), alias="__root__")
+    _ts: np.ndarray = field(repr=False)
+    _mv: np.ndarray = field(repr=False)
+    _na: np.ndarray = field(repr=False)
+    _mb: np.ndarray = field(repr=False)
+    # number of valid rows
+    _n: int = field(repr=False)
+    # whether rows are known to be in ascending timestamp order
+    _sorted: bool = field(repr=False)
+    # (ts_now, (historical, weighted)) of the last `compute_market_values`,
+    # exports ask for the same `ts_now` many times. dropped on any change.
+    _market_values_cache: Optional[Tuple[int, Tuple[int, int]]] = field(repr=False)
+    COLUMNS_DTYPE: ClassVar[Tuple[type, ...]] = (
+        np.int64,
+        np.float64,
+        np.int32,
+        np.float64,
+    )
+    MIN_CAPACITY: ClassVar[int] = 8
     DAY_WEIGHTS: ClassVar[List[int]] = [
         4,
         5,
@@ -266,18 +312,297 @@ class MarketValueRecords(_RootListMixin[MarketValueRecord]):
     ]
     HISTORICAL_DAYS: ClassVar[int] = 60
 
+    def __init__(self, __root__: Iterable[MarketValueRecord] = ()) -> None:
+        self.__root__ = __root__
+
+    @classmethod
+    def from_columns(
+        cls,
+        timestamps: Sequence[int],
+        market_values: Sequence[Optional[float]],
+        num_auctions: Sequence[int],
+        min_buyouts: Sequence[Optional[float]],
+    ) -> "MarketValueRecords":
+        """build from columns, `None` or `NaN` for missing market values or
+        min buyouts.
+        """
+        o = cls.__new__(cls)
+        o._set_columns(timestamps, market_values, num_auctions, min_buyouts)
+        return o
+
+    @classmethod
+    def _from_views(
+        cls,
+        timestamps: np.ndarray,
+        market_values: np.ndarray,
+        num_auctions: np.ndarray,
+        min_buyouts: np.ndarray,
+        is_sorted: bool,
+    ) -> "MarketValueRecords":
+        """wrap columns already in `COLUMNS_DTYPE` as they are, no copies. rows are
+        written in place later on, so these must be slices nothing else writes to,
+        like the disjoint slices of one buffer `from_protobuf` hands out.
+        """
+        o = cls.__new__(cls)
+        o._ts, o._mv, o._na, o._mb = (
+            timestamps,
+            market_values,
+            num_auctions,
+            min_buyouts,
+        )
+        o._n = len(timestamps)
+        o._sorted = is_sorted
+        o._market_values_cache = None
+        return o
+
+    @property
+    def __root__(self) -> List[MarketValueRecord]:
+        return list(self)
+
+    @__root__.setter
+    def __root__(self, records: Iterable[MarketValueRecord]) -> None:
+        records = list(records)
+        self._set_columns(
+            [record.timestamp for record in records],
+            [record.market_value for record in records],
+            [record.num_auctions for record in records],
+            [record.min_buyout for record in records],
+        )
+
+    def _set_columns(
+        self,
+        timestamps: Sequence[int],
+        market_values: Sequence[Optional[float]],
+        num_auctions: Sequence[int],
+        min_buyouts: Sequence[Optional[float]],
+    ) -> None:
+        # `np.array` turns `None` into `NaN` for float columns
+        columns = [
+            np.array(column, dtype=dtype)
+            for column, dtype in zip(
+                (timestamps, market_values, num_auctions, min_buyouts),
+                self.COLUMNS_DTYPE,
+            )
+        ]
+        n = len(columns[0])
+        if any(len(column) != n for column in columns):
+            raise ValueError("columns must have the same length")
+
+        self._ts, self._mv, self._na, self._mb = columns
+        self._n = n
+        ts = self._ts
+        self._sorted = n < 2 or bool(np.all(ts[1:] >= ts[:-1]))
+        self._market_values_cache = None
+
+    def _get_columns(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """views of the valid rows of all columns:
+        (timestamps, market values, num auctions, min buyouts)
+        """
+        n = self._n
+        return self._ts[:n], self._mv[:n], self._na[:n], self._mb[:n]
+
+    def _reserve(self, capacity: int) -> None:
+        """make sure columns can hold at least `capacity` rows"""
+        old_capacity = len(self._ts)
+        if capacity <= old_capacity:
+            return
+
+        # double the capacity each time, so appending is amortized O(1)
+        capacity = max(capacity, 2 * old_capacity, self.MIN_CAPACITY)
+        columns = []
+        for column, dtype in zip(self._get_columns(), self.COLUMNS_DTYPE):
+            new_column = np.empty(capacity, dtype=dtype)
+            new_column[: self._n] = column
+            columns.append(new_column)
+
+        self._ts, self._mv, self._na, self._mb = columns
+
+    def _keep(self, rows: Union[np.ndarray, slice]) -> None:
+        """keep only `rows` (index array, boolean mask or slice) in place,
+        in that order. rows kept out of order must update `_sorted`.
+        """
+        for column in self._get_columns():
+            kept = column[rows]
+            column[: len(kept)] = kept
+
+        self._n = len(kept)
+        self._market_values_cache = None
+
+    def _make_records(self, rows: slice) -> List[MarketValueRecord]:
+        """materialize `rows`, columns are cast to the record field types in bulk"""
+        ts, mv, na, mb = (column[rows] for column in self._get_columns())
+        ts = ts.astype(np.int32)
+        na = na.astype(np.int32)
+        # NaN (None) becomes 0 here, masked back below
+        is_mv = ~np.isnan(mv)
+        is_mb = ~np.isnan(mb)
+        mv = np.where(is_mv, mv, 0).astype(np.int64)
+        mb = np.where(is_mb, mb, 0).astype(np.int64)
+        return [
+            MarketValueRecord._from_converted(
+                ts[i],
+                mv[i] if is_mv_i else None,
+                na[i],
+                mb[i] if is_mb_i else None,
+            )
+            for i, (is_mv_i, is_mb_i) in enumerate(zip(is_mv.tolist(), is_mb.tolist()))
+        ]
+
+    def _make_record(self, i: int) -> MarketValueRecord:
+        market_value = self._mv[i]
+        min_buyout = self._mb[i]
+        return MarketValueRecord._from_converted(
+            np.int32(self._ts[i]),
+            None if np.isnan(market_value) else np.int64(market_value),
+            np.int32(self._na[i]),
+            None if np.isnan(min_buyout) else np.int64(min_buyout),
+        )
+
+    def _normalize_index(self, index: int) -> int:
+        if index < 0:
+            index += self._n
+
+        if not 0 <= index < self._n:
+            raise IndexError("market value record index out of range")
+
+        return index
+
+    def __len__(self) -> int:
+        return self._n
+
+    def __iter__(self) -> Iterator[MarketValueRecord]:
+        return iter(self._make_records(slice(None)))
+
+    def __getitem__(self, index: int) -> MarketValueRecord:
+        return self._make_record(self._normalize_index(index))
+
+    def __setitem__(self, index: int, value: MarketValueRecord) -> None:
+        self._write_record(self._normalize_index(index), value)
+        self._sorted = False
+
+    def _write_record(self, i: int, value: MarketValueRecord) -> None:
+        self._market_values_cache = None
+        self._ts[i] = value.timestamp
+        self._mv[i] = np.nan if value.market_value is None else value.market_value
+        self._na[i] = value.num_auctions
+        self._mb[i] = np.nan if value.min_buyout is None else value.min_buyout
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, MarketValueRecords):
+            return NotImplemented
+
+        return len(self) == len(other) and all(
+            np.array_equal(a, b, equal_nan=True)
+            for a, b in zip(self._get_columns(), other._get_columns())
+        )
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(__root__={self.__root__!r})"
+
+    def append(self, value: MarketValueRecord) -> None:
+        n = self._n
+        if n == len(self._ts):
+            self._reserve(n + 1)
+
+        # write straight into the free slot, no index checks needed
+        self._write_record(n, value)
+        self._n = n + 1
+        if n and self._sorted and self._ts[n] < self._ts[n - 1]:
+            self._sorted = False
+
+    def extend(self, other: "MarketValueRecords") -> None:
+        """append all records of `other` in order, column by column"""
+        n = self._n
+        m = other._n
+        if not m:
+            return
+
+        self._reserve(n + m)
+        for column, other_column in zip(
+            (self._ts, self._mv, self._na, self._mb), other._get_columns()
+        ):
+            column[n : n + m] = other_column
+
+        self._n = n + m
+        self._market_values_cache = None
+        if self._sorted and (
+            not other._sorted or (n and self._ts[n] < self._ts[n - 1])
+        ):
+            self._sorted = False
+
+    def pop(self, index: int = -1) -> MarketValueRecord:
+        index = self._normalize_index(index)
+        record = self._make_record(index)
+        self._keep(np.delete(np.arange(self._n), index))
+        return record
+
+    def sort(self) -> None:
+        """sort by timestamp in ascending order, no-op if already sorted"""
+        if self._sorted:
+            return
+
+        ts, _, _, _ = self._get_columns()
+        self._keep(np.argsort(ts, kind="stable"))
+        self._sorted = True
+
     def add(self, market_value_record: MarketValueRecord, sort: bool = False) -> int:
         # TODO: go over all methods having `sort` parameter, making sure it
         # doesn't do extra work. (for example, for `ItemStringMarketValueRecords`,
         # we don't have to sort all records, just the ones that are added)
-        self.append(market_value_record)
-        if sort:
-            self.sort()
+        n = self._n
+        if (
+            sort
+            and self._sorted
+            and n
+            and market_value_record.timestamp < self._ts[n - 1]
+        ):
+            # out of order into sorted records, shift the newer ones instead of
+            # sorting everything again. after equal timestamps, as a stable sort.
+            self._insert(
+                int(
+                    np.searchsorted(
+                        self._ts[:n], market_value_record.timestamp, side="right"
+                    )
+                ),
+                market_value_record,
+            )
+        else:
+            self.append(market_value_record)
+            if sort:
+                self.sort()
 
         return 1
 
+    def _insert(self, i: int, value: MarketValueRecord) -> None:
+        n = self._n
+        if n == len(self._ts):
+            self._reserve(n + 1)
+
+        for column in (self._ts, self._mv, self._na, self._mb):
+            # numpy copies overlapping slices through a buffer
+            column[i + 1 : n + 1] = column[i:n]
+
+        self._write_record(i, value)
+        self._n = n + 1
+
     def empty(self):
-        self.__root__ = []
+        self._n = 0
+        self._market_values_cache = None
+
+    def copy(self) -> "MarketValueRecords":
+        """independent copy, records only exist as column values so copying the
+        columns is a deep copy.
+        """
+        return self.from_columns(*self._get_columns())
+
+    @classmethod
+    def concatenate(
+        cls, records_list: Sequence["MarketValueRecords"]
+    ) -> "MarketValueRecords":
+        """records of all `records_list` in the given order, unsorted"""
+        return cls.from_columns(
+            *map(np.concatenate, zip(*(r._get_columns() for r in records_list)))
+        )
 
     def compress(self, ts_now: int, ts_expires_in: int) -> int:
         """average all records in the range of 1 day down to 1 record,
@@ -288,57 +613,173 @@ class MarketValueRecords(_RootListMixin[MarketValueRecord]):
         ts_end = ts_now - ts_now % SECONDS_IN.DAY
         # round up so we don't miss any records
         n_days = (ts_expires_in + SECONDS_IN.DAY - 1) // SECONDS_IN.DAY
-        comporessed_records = self.average_by_day(
+        compressed_columns, has_record = self._compress_by_day(
             self,
             ts_end,
             n_days,
-            return_compressed_record=True,
-        )
-        comporessed_records = (
-            record for record in comporessed_records if record is not None
+            is_records_sorted=self._sorted,
         )
         n_before = len(self)
         # remove records that gets compressed
         self.remove_expired(ts_end)
         # prepend compressed records
-        self.__root__ = [*comporessed_records, *self]
+        self._set_columns(
+            *(
+                np.concatenate((compressed[has_record], column))
+                for compressed, column in zip(compressed_columns, self._get_columns())
+            )
+        )
         n_after = len(self)
         return n_before - n_after
 
     def remove_expired(self, ts_expires: int) -> int:
         """remove records that are older than `ts_expires` (timestamp < ts_expires)"""
         len_before = len(self)
-        self.__root__ = [record for record in self if record.timestamp >= ts_expires]
+        ts, _, _, _ = self._get_columns()
+        if self._sorted:
+            # expired ones are all at the front
+            n_expired = int(np.searchsorted(ts, ts_expires))
+            if n_expired:
+                self._keep(slice(n_expired, None))
+        else:
+            is_kept = ts >= ts_expires
+            if not is_kept.all():
+                self._keep(is_kept)
+
+        # nothing expired leaves the records (and their cached values) untouched
         return len_before - len(self)
 
-    def get_recent_num_auctions(self, ts_last_update_begin: int) -> int:
-        # return newest record
+    def has_data_since(self, ts: int) -> bool:
+        """whether the newest record (the one `get_recent` looks at) is at or
+        after `ts`
+        """
+        n = self._n
+        return n > 0 and self._ts[n - 1] >= ts
+
+    def get_recent(self, ts_last_update_begin: int) -> Tuple[int, int, int]:
+        """(num auctions, min buyout, market value) of the newest record, 0 for
+        missing values or if the newest record is older than
+        `ts_last_update_begin`.
+        """
         # TODO: check that records without any auctions (None marketvalue) are added,
         # because sometimes there are no auctions for an item
-        if (
-            self
-            and self[-1].timestamp >= ts_last_update_begin
-            and self[-1].num_auctions
-        ):
-            return self[-1].num_auctions
-        else:
-            return 0
+        i = self._n - 1
+        if i < 0 or self._ts[i] < ts_last_update_begin:
+            return 0, 0, 0
+
+        min_buyout = self._mb[i]
+        market_value = self._mv[i]
+        # NaN (None) is not equal to itself
+        return (
+            int(self._na[i]),
+            int(min_buyout) if min_buyout == min_buyout else 0,
+            int(market_value) if market_value == market_value else 0,
+        )
+
+    def get_recent_num_auctions(self, ts_last_update_begin: int) -> int:
+        # return newest record
+        return self.get_recent(ts_last_update_begin)[0]
 
     def get_recent_min_buyout(self, ts_last_update_begin: int) -> int:
-        if self and self[-1].timestamp >= ts_last_update_begin and self[-1].min_buyout:
-            return self[-1].min_buyout
-        else:
-            return 0
+        return self.get_recent(ts_last_update_begin)[1]
 
     def get_recent_market_value(self, ts_last_update_begin) -> int:
-        if (
-            self
-            and self[-1].timestamp >= ts_last_update_begin
-            and self[-1].market_value
-        ):
-            return self[-1].market_value
+        return self.get_recent(ts_last_update_begin)[2]
+
+    @classmethod
+    def _bucket_by_day(
+        cls,
+        records: "MarketValueRecords",
+        ts_now: int,
+        n_days_before: int,
+        is_records_sorted: bool = True,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """find records that fall in the range of `average_by_day`, returns their
+        indices in `records` and their day bucket (0 for the day right before
+        `ts_now`), records without market value are left out.
+        """
+        ts, mv, _, _ = records._get_columns()
+        if is_records_sorted:
+            # binary search the range instead of checking every record
+            lo = np.searchsorted(ts, ts_now - n_days_before * SECONDS_IN.DAY)
+            hi = np.searchsorted(ts, ts_now)
+            idx = np.arange(lo, max(lo, hi))
+            # every `n * SECONDS_IN.DAY` is the start of a new day
+            day = (ts_now - ts[idx] - 1) // SECONDS_IN.DAY
+            # same range check as below, in case records aren't actually sorted
+            mask = (day >= 0) & (day < n_days_before) & ~np.isnan(mv[idx])
+            idx = idx[mask]
+            day = day[mask]
         else:
-            return 0
+            day = (ts_now - ts - 1) // SECONDS_IN.DAY
+            mask = (day >= 0) & (day < n_days_before) & ~np.isnan(mv)
+            idx = np.flatnonzero(mask)
+            day = day[mask]
+
+        return idx, day
+
+    @classmethod
+    def _average_by_day(
+        cls,
+        records: "MarketValueRecords",
+        ts_now: int,
+        n_days_before: int,
+        is_records_sorted: bool = True,
+    ) -> np.ndarray:
+        """same as `average_by_day`, but returns an array with NaN for days
+        without any records.
+        """
+        _, mv, _, _ = records._get_columns()
+        idx, day = cls._bucket_by_day(records, ts_now, n_days_before, is_records_sorted)
+        counts = np.bincount(day, minlength=n_days_before)
+        sums = np.bincount(day, weights=mv[idx], minlength=n_days_before)
+        with np.errstate(invalid="ignore"):
+            # empty buckets are 0 / 0 = NaN
+            days_average = np.floor(sums / counts + 0.5)
+
+        # bucket 0 is the most recent day, oldest day goes first in the output
+        return days_average[::-1]
+
+    @classmethod
+    def _compress_by_day(
+        cls,
+        records: "MarketValueRecords",
+        ts_now: int,
+        n_days_before: int,
+        is_records_sorted: bool = True,
+    ) -> Tuple[Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray], np.ndarray]:
+        """same as `average_by_day(..., return_compressed_record=True)`, returns
+        the compressed records as columns (see `_get_columns`) of length
+        `n_days_before`, and a mask of days that actually have records.
+        """
+        # 1. put market value snapshots into buckets of 1 day
+        _, mv, num_auctions, min_buyout = records._get_columns()
+        idx, day = cls._bucket_by_day(records, ts_now, n_days_before, is_records_sorted)
+
+        # 2. average each bucket so we get averaged market value for each day
+        #    note that some buckets may be empty, indicated by `has_record`.
+        counts = np.bincount(day, minlength=n_days_before)
+        sum_market_value = np.bincount(day, weights=mv[idx], minlength=n_days_before)
+        sum_num_auctions = np.bincount(
+            day, weights=num_auctions[idx], minlength=n_days_before
+        )
+        # `fmin` skips NaN, so days without any min buyout stay NaN
+        min_min_buyout = np.full(n_days_before, np.nan)
+        np.fmin.at(min_min_buyout, day, min_buyout[idx])
+        with np.errstate(invalid="ignore"):
+            avg_market_value = np.floor(sum_market_value / counts + 0.5)
+            avg_num_auctions = np.floor(sum_num_auctions / counts + 0.5)
+
+        # mid-day timestamp
+        time_stamp = ts_now - (np.arange(n_days_before) + 0.5) * SECONDS_IN.DAY
+        columns = (
+            time_stamp.astype(np.int64),
+            avg_market_value,
+            np.nan_to_num(avg_num_auctions).astype(np.int32),
+            min_min_buyout,
+        )
+        # oldest day goes first
+        return tuple(column[::-1] for column in columns), counts[::-1] > 0
 
     @classmethod
     def average_by_day(
@@ -356,54 +797,21 @@ class MarketValueRecords(_RootListMixin[MarketValueRecord]):
 
         note that records should be passed in ascending order
         """
-        # 1. put market value snapshots into buckets of 1 day
-        buckets = defaultdict(list)
-        for record in reversed(records):
-            if record.market_value is None:
-                continue
-            # every `n * SECONDS_IN.DAY` is the start of a new day
-            i = (ts_now - record.timestamp - 1) // SECONDS_IN.DAY
-            if i < 0:
-                continue
-
-            elif i < n_days_before:
-                buckets[i].append(record)
-
-            elif is_records_sorted:
-                # if records are sorted in descending order, we can stop
-                # processing them when we reach the first record that is
-                # older than `n_days_before`
-                break
-
-        # 2. average each bucket so we get averaged market value for each day
-        #    note that some buckets may be empty, indicated by `None` instead
-        #    of an average.
-        days_average = [None] * n_days_before
-        for i, records in buckets.items():
-            if not records:
-                continue
-
-            day = n_days_before - i - 1
-            n_records = len(records)
-            avg_market_value = sum(r.market_value for r in records) / n_records
-            avg_market_value = int(avg_market_value + 0.5)
-
-            if return_compressed_record:
-                avg_num_auctions = sum(r.num_auctions for r in records) / n_records
-                avg_num_auctions = int(avg_num_auctions + 0.5)
-                min_min_buyout = min(record.min_buyout for record in records)
-                # mid-day timestamp
-                time_stamp = int(ts_now - (i + 0.5) * SECONDS_IN.DAY)
-                days_average[day] = MarketValueRecord(
-                    timestamp=time_stamp,
-                    market_value=avg_market_value,
-                    num_auctions=avg_num_auctions,
-                    min_buyout=min_min_buyout,
-                )
-            else:
-                days_average[day] = avg_market_value
+        if not return_compressed_record:
+            days_average = cls._average_by_day(
+                records, ts_now, n_days_before, is_records_sorted
+            )
+            # plain floats, one slot per day; NaN (empty day) is not equal to itself
+            return [None if avg != avg else int(avg) for avg in days_average.tolist()]
 
-        return days_average
+        columns, has_record = cls._compress_by_day(
+            records, ts_now, n_days_before, is_records_sorted
+        )
+        compressed_records = cls.from_columns(*columns)
+        return [
+            compressed_records._make_record(day) if is_day_recorded else None
+            for day, is_day_recorded in enumerate(has_record.tolist())
+        ]
 
     def get_historical_market_value(self, ts_now: int) -> int:
         # TSM says it's a 60-day average of "weighted market value", I'm just
@@ -419,46 +827,149 @@ class MarketValueRecords(_RootListMixin[MarketValueRecord]):
             )
             return 0
 
-        days_average = self.average_by_day(
-            self, ts_now, self.HISTORICAL_DAYS, is_records_sorted=True
+        cache = self._market_values_cache
+        if cache is not None and cache[0] == ts_now:
+            return cache[1][0]
+
+        days_average = self._average_by_day(
+            self, ts_now, self.HISTORICAL_DAYS, is_records_sorted=self._sorted
         )
-        # calculate average of all buckets that are not None
-        sum_market_value = 0
-        n_days = 0
-        for avg in days_average:
-            if avg is not None:
-                sum_market_value += avg
-                n_days += 1
+        return self._historical_from_days(days_average)
 
-        if n_days == 0:
+    def get_weighted_market_value(self, ts_now: int) -> int:
+        if not self:
             self._logger.debug(
-                f"{self}: all records expired, get_historical_market_value() returns 0"
+                f"{self}: no records, get_weighted_market_value() returns 0"
             )
             return 0
 
-        return int(sum_market_value / n_days + 0.5)
+        cache = self._market_values_cache
+        if cache is not None and cache[0] == ts_now:
+            return cache[1][1]
 
-    def get_weighted_market_value(self, ts_now: int) -> int:
+        days_average = self._average_by_day(
+            self, ts_now, len(self.DAY_WEIGHTS), is_records_sorted=self._sorted
+        )
+        return self._weighted_from_days(days_average)
+
+    def compute_market_values(self, ts_now: int) -> Tuple[int, int]:
+        """`get_historical_market_value` and `get_weighted_market_value` in one go,
+        records are only bucketed once for both of them.
+
+        >>> historical, weighted = market_value_records.compute_market_values(ts)
+
+        the result is kept until records change, asking again with the same
+        `ts_now` is free.
+        """
         if not self:
+            self._logger.debug(f"{self}: no records, compute_market_values() returns 0")
+            return 0, 0
+
+        cache = self._market_values_cache
+        if cache is not None and cache[0] == ts_now:
+            return cache[1]
+
+        n_days = max(self.HISTORICAL_DAYS, len(self.DAY_WEIGHTS))
+        days_average = self._average_by_day(
+            self, ts_now, n_days, is_records_sorted=self._sorted
+        )
+        # days are in ascending order, both ranges end at the day before `ts_now`
+        market_values = (
+            self._historical_from_days(days_average[-self.HISTORICAL_DAYS :]),
+            self._weighted_from_days(days_average[-len(self.DAY_WEIGHTS) :]),
+        )
+        self._market_values_cache = (ts_now, market_values)
+        return market_values
+
+    @classmethod
+    def batch_compute_market_values(
+        cls, records_list: Sequence["MarketValueRecords"], ts_now: int
+    ) -> None:
+        """`compute_market_values(ts_now)` of every `records` in `records_list` at
+        once, the results are left in their caches. Records of all items are
+        bucketed together, each (item, day) being one bucket, so the numpy
+        calls are per batch instead of per item. results are exactly the same,
+        per bucket sums run in record order either way and day averages are
+        whole numbers, summing them is exact in any order.
+        """
+        # results cached for another `ts_now` are computed again here as well,
+        # rather than one by one on the next `compute_market_values(ts_now)`.
+        records_list = [
+            records
+            for records in records_list
+            if records
+            and (
+                records._market_values_cache is None
+                or records._market_values_cache[0] != ts_now
+            )
+        ]
+        if not records_list:
+            return
+
+        n_items = len(records_list)
+        n_days = max(cls.HISTORICAL_DAYS, len(cls.DAY_WEIGHTS))
+        ts = np.concatenate([records._ts[: records._n] for records in records_list])
+        mv = np.concatenate([records._mv[: records._n] for records in records_list])
+        item = np.repeat(np.arange(n_items), [records._n for records in records_list])
+        # same bucketing as `_bucket_by_day`, which doesn't depend on record order
+        day = (ts_now - ts - 1) // SECONDS_IN.DAY
+        mask = (day >= 0) & (day < n_days) & ~np.isnan(mv)
+        bucket = item[mask] * n_days + day[mask]
+        counts = np.bincount(bucket, minlength=n_items * n_days)
+        sums = np.bincount(bucket, weights=mv[mask], minlength=n_items * n_days)
+        with np.errstate(invalid="ignore"):
+            # empty buckets are 0 / 0 = NaN, column 0 is the most recent day
+            days_average = np.floor(sums / counts + 0.5).reshape(n_items, n_days)
+
+        has_average = ~np.isnan(days_average)
+        days_average[~has_average] = 0
+        # historical: average over the days that have records
+        historical_days = slice(0, cls.HISTORICAL_DAYS)
+        historical_sums = days_average[:, historical_days].sum(axis=1)
+        historical_counts = has_average[:, historical_days].sum(axis=1)
+        # weighted: `DAY_WEIGHTS` goes from the oldest day to the most recent one
+        weights = np.asarray(cls.DAY_WEIGHTS)[::-1]
+        weighted_days = slice(0, len(cls.DAY_WEIGHTS))
+        weighted_sums = days_average[:, weighted_days] @ weights
+        weighted_weights = has_average[:, weighted_days] @ weights
+
+        for records, h_sum, h_count, w_sum, w_weight in zip(
+            records_list,
+            historical_sums.tolist(),
+            historical_counts.tolist(),
+            weighted_sums.tolist(),
+            weighted_weights.tolist(),
+        ):
+            records._market_values_cache = (
+                ts_now,
+                (
+                    int(h_sum / h_count + 0.5) if h_count else 0,
+                    int(w_sum / w_weight + 0.5) if w_weight else 0,
+                ),
+            )
+
+    def _historical_from_days(self, days_average: np.ndarray) -> int:
+        # calculate average of all buckets that are not None
+        days_average = days_average[~np.isnan(days_average)]
+        n_days = len(days_average)
+        if n_days == 0:
             self._logger.debug(
-                f"{self}: no records, get_weighted_market_value() returns 0"
+                f"{self}: all records expired, get_historical_market_value() returns 0"
             )
             return 0
 
-        days_average = self.average_by_day(
-            self, ts_now, len(self.DAY_WEIGHTS), is_records_sorted=True
-        )
+        return int(days_average.sum() / n_days + 0.5)
+
+    def _weighted_from_days(self, days_average: np.ndarray) -> int:
         # calculate weighted average over all buckets that are not None
-        sum_market_value = 0
-        sum_weights = 0
-        for i, avg in enumerate(days_average):
-            if avg is not None:
-                sum_market_value += avg * self.DAY_WEIGHTS[i]
-                sum_weights += self.DAY_WEIGHTS[i]
+        mask = ~np.isnan(days_average)
+        weights = np.asarray(self.DAY_WEIGHTS)[mask]
+        sum_weights = weights.sum()
 
         # should return 0 according to TSM
         # https://github.com/WouterBink/TradeSkillMaster-1/blob/master/TradeSkillMaster_AuctionDB/Modules/data.lua#L115
         if sum_weights:
+            sum_market_value = np.dot(days_average[mask], weights)
             return int(sum_market_value / sum_weights + 0.5)
         else:
             self._logger.debug(
@@ -513,9 +1024,33 @@ class ItemString:
     mods: Optional[Tuple[np.int32, ...]] = field(
         converter=CW.optional(CW.iter(tuple, np.int32))
     )
+    # `to_str` of the (frozen) fields above, worked out on first use
+    _str: Optional[str] = field(init=False, default=None, repr=False, eq=False)
 
     KEEPED_MODIFIERS_TYPES: ClassVar[List[int]] = [9, 29, 30]
     MAP_BONUSES: ClassVar[Dict] = map_bonuses
+    _MAP_BONUSES_KEYS: ClassVar[frozenset] = frozenset(map_bonuses)
+    # `MAP_BONUSES` flattened for `get_ilvl`, a bonus lands in the first of
+    # these it qualifies for, same precedence as `get_ilvl` checks them.
+    BONUS_LEVEL_DELTA: ClassVar[Dict[int, int]] = {
+        bid: binfo["level"] for bid, binfo in map_bonuses.items() if "level" in binfo
+    }
+    BONUS_BASE_LEVEL: ClassVar[Dict[int, int]] = {
+        bid: binfo["base_level"]
+        for bid, binfo in map_bonuses.items()
+        if "level" not in binfo and "base_level" in binfo
+    }
+    BONUS_CURVE_ID: ClassVar[Dict[int, int]] = {
+        bid: binfo["curveId"]
+        for bid, binfo in map_bonuses.items()
+        if "level" not in binfo and "base_level" not in binfo and "curveId" in binfo
+    }
+    # >>> {bonus_id: (player_levels, item_levels)}, sorted by player level
+    BONUS_CURVE_POINTS: ClassVar[Dict[int, Tuple[np.ndarray, np.ndarray]]] = {
+        bid: tuple(np.array(binfo["points"], dtype=np.int32).reshape(-1, 2).T)
+        for bid, binfo in map_bonuses.items()
+        if "points" in binfo
+    }
     SET_BONUS_ILVL_FIELDS: ClassVar[Set[str]] = {
         "level",
         "base_level",
@@ -523,7 +1058,37 @@ class ItemString:
         "points",
     }
     MOD_TYPE_PLAYER_LEVEL: ClassVar[int] = 9
+    # made up mod keys used to store ilvl, see `from_auction_item`
+    _ILVL_MOD_KEYS: ClassVar[frozenset] = frozenset(
+        e.value for e in ILVL_MODIFIERS_TYPES
+    )
     DEFAULT_PLAYER_LVL: ClassVar[int] = 1
+    _TYPE_PB: ClassVar[Dict[ItemStringTypeEnum, int]] = {
+        ItemStringTypeEnum.ITEM: ItemStringTypePB.ITEM,
+        ItemStringTypeEnum.PET: ItemStringTypePB.PET,
+    }
+    _TYPE_FROM_PB: ClassVar[Dict[int, ItemStringTypeEnum]] = {
+        type_pb: type_ for type_, type_pb in _TYPE_PB.items()
+    }
+    # pool of live instances made by `from_*`, keyed by their fields. the same
+    # item shows up in thousands of auctions, share one (frozen) instance.
+    _INTERNED: ClassVar[WeakValueDictionary] = WeakValueDictionary()
+
+    @classmethod
+    def _interned(
+        cls,
+        type: ItemStringTypeEnum,
+        id: int,
+        bonuses: Optional[Tuple[int, ...]],
+        mods: Optional[Tuple[int, ...]],
+    ) -> "ItemString":
+        key = (type, id, bonuses, mods)
+        obj = cls._INTERNED.get(key)
+        if obj is None:
+            obj = cls(type=type, id=id, bonuses=bonuses, mods=mods)
+            cls._INTERNED[key] = obj
+
+        return obj
 
     @classmethod
     def from_item(cls, item: GenericItemInterface) -> str:
@@ -537,7 +1102,7 @@ class ItemString:
     @classmethod
     def from_auction_item(cls, item: AuctionItem) -> "ItemString":
         if item.pet_species_id is not None:
-            return cls(
+            return cls._interned(
                 type=ItemStringTypeEnum.PET,
                 id=item.pet_species_id,
                 bonuses=None,
@@ -547,14 +1112,16 @@ class ItemString:
         else:
             if item.bonus_lists:
                 # we will not sort bonus ids as for now
-                bonuses = list(filter(cls.MAP_BONUSES.__contains__, item.bonus_lists))
+                bonuses = list(
+                    filter(cls._MAP_BONUSES_KEYS.__contains__, item.bonus_lists)
+                )
 
             else:
                 bonuses = None
 
             plvl = None
-            heap = []
             if item.modifiers:
+                pairs = []
                 for mod in item.modifiers:
                     mod_type = mod["type"]
                     mod_value = mod["value"]
@@ -562,12 +1129,10 @@ class ItemString:
                         continue
                     if mod_type == cls.MOD_TYPE_PLAYER_LEVEL:
                         plvl = mod_value
-                    heappush(heap, (mod_type, mod_value))
-                mods = []
-                while heap:
-                    mod_type, mod_value = heappop(heap)
-                    mods.append(mod_type)
-                    mods.append(mod_value)
+                    pairs.append((mod_type, mod_value))
+                # at most a few pairs, sorting them is cheaper than a heap
+                pairs.sort()
+                mods = [v for pair in pairs for v in pair]
             else:
                 mods = None
 
@@ -581,7 +1146,7 @@ class ItemString:
             bonuses = sorted(bonuses) if bonuses else None
 
             if ilvl_info is None:
-                return cls(
+                return cls._interned(
                     type=ItemStringTypeEnum.ITEM,
                     id=item.id,
                     bonuses=tuple(bonuses) if bonuses else None,
@@ -595,7 +1160,7 @@ class ItemString:
                 # mods.
                 ilvl, is_relative = ilvl_info
                 if is_relative:
-                    o = cls(
+                    o = cls._interned(
                         type=ItemStringTypeEnum.ITEM,
                         id=item.id,
                         bonuses=None,
@@ -603,7 +1168,7 @@ class ItemString:
                     )
 
                 else:
-                    o = cls(
+                    o = cls._interned(
                         type=ItemStringTypeEnum.ITEM,
                         id=item.id,
                         bonuses=None,
@@ -626,15 +1191,18 @@ class ItemString:
         # last_curve_info = None
         last_curve_bid = None
         for bid in bonuses:
-            binfo = cls.MAP_BONUSES[bid]
-            if "level" in binfo:
-                delta = binfo["level"]
+            delta = cls.BONUS_LEVEL_DELTA.get(bid)
+            if delta is not None:
                 ilvl_rel = delta if ilvl_rel is None else ilvl_rel + delta
+                continue
 
-            elif "base_level" in binfo:
-                ilvl_base = ilvl_base or binfo["base_level"]
+            base_level = cls.BONUS_BASE_LEVEL.get(bid)
+            if base_level is not None:
+                ilvl_base = ilvl_base or base_level
+                continue
 
-            elif "curveId" in binfo:
+            curve_id = cls.BONUS_CURVE_ID.get(bid)
+            if curve_id is not None:
                 # there might be multiple curves and we need to
                 # sort them, TSM's sorting rule is:
                 # flat1, flat2 -> max(bonus1, bonus2)
@@ -655,8 +1223,7 @@ class ItemString:
                     # sort by curve id
                     last_curve_bid = (
                         last_curve_bid
-                        if cls.MAP_BONUSES[last_curve_bid]["curveId"]
-                        > cls.MAP_BONUSES[bid]["curveId"]
+                        if cls.BONUS_CURVE_ID[last_curve_bid] > curve_id
                         else bid
                     )
 
@@ -690,52 +1257,40 @@ class ItemString:
     @lru_cache(1024 * 512)
     # def get_ilvl_from_curve(cls, curve_points: List[Dict], plvl=DEFAULT_PLAYER_LVL):
     def get_ilvl_from_curve(cls, bonus_id: int, plvl: int) -> Optional[int]:
-        curve_points = cls.MAP_BONUSES[bonus_id]["points"]
-        # >>> curve_points = [
-        #     # [player_level, item_level]; sorted by player_level
-        #     [1, 10],
-        #     [2, 20],
-        #     ...
-        # ]
-        if not curve_points:
+        plvls, ilvls = cls.BONUS_CURVE_POINTS[bonus_id]
+        # >>> plvls, ilvls = [1, 2, ...], [10, 20, ...]; sorted by player level
+        if not len(plvls):
             raise ValueError("Invalid curve points")
 
         # assuming it's soreted by player level
-        plvl = max(plvl, curve_points[0][0])
-        plvl = min(plvl, curve_points[-1][0])
-        point1, point2 = None, None
-        for point in curve_points:
-            if point[0] == plvl:
-                return point[1]
-            elif point[0] > plvl:
-                point2 = point
-                break
-            else:
-                point1 = point
-
-        if not point1 or not point2:
-            # I don't think this could ever happen...
-            raise ValueError("Invalid curve points")
+        plvl = max(plvl, int(plvls[0]))
+        plvl = min(plvl, int(plvls[-1]))
+        # first point at or above `plvl`, there's always one after clamping
+        k = int(np.searchsorted(plvls, plvl))
+        if plvls[k] == plvl:
+            return int(ilvls[k])
 
         # linear interpolation
-        plvl1, ilvl1 = point1[0], point1[1]
-        plvl2, ilvl2 = point2[0], point2[1]
+        plvl1, ilvl1 = int(plvls[k - 1]), int(ilvls[k - 1])
+        plvl2, ilvl2 = int(plvls[k]), int(ilvls[k])
         return int((plvl - plvl1) * (ilvl2 - ilvl1) / (plvl2 - plvl1) + ilvl1 + 0.5)
 
     @classmethod
     def from_commodity_item(cls, item: CommodityItem) -> "ItemString":
-        return cls(type=ItemStringTypeEnum.ITEM, id=item.id, bonuses=None, mods=None)
+        return cls._interned(
+            type=ItemStringTypeEnum.ITEM, id=item.id, bonuses=None, mods=None
+        )
 
     @classmethod
     def from_protobuf(cls, proto: ItemStringPB) -> "ItemString":
-        if proto.type == ItemStringTypePB.ITEM:
-            type = ItemStringTypeEnum.ITEM
-        elif proto.type == ItemStringTypePB.PET:
-            type = ItemStringTypeEnum.PET
-        else:
+        # a dict rather than comparing against the (slow to look up) pb enum values
+        type = cls._TYPE_FROM_PB.get(proto.type)
+        if type is None:
             raise ValueError(f"unknown type: {proto.type}")
 
-        return cls(
+        # databases loaded one after another (e.g. all realms of a region) share
+        # most of their items, only the first load pays for construction.
+        return cls._interned(
             type=type,
             id=proto.id,
             bonuses=tuple(proto.bonus) if proto.bonus else None,
@@ -743,18 +1298,24 @@ class ItemString:
         )
 
     def to_protobuf(self) -> ItemStringPB:
-        if self.type == ItemStringTypeEnum.ITEM:
-            type = ItemStringTypePB.ITEM
-        elif self.type == ItemStringTypeEnum.PET:
-            type = ItemStringTypePB.PET
-        else:
+        proto = ItemStringPB()
+        self._fill_protobuf(proto)
+        return proto
+
+    def _fill_protobuf(self, proto: ItemStringPB) -> None:
+        """set fields of an empty `proto` in place, saves building a message only
+        to copy it into an `Item`.
+        """
+        type = self._TYPE_PB.get(self.type)
+        if type is None:
             raise ValueError(f"unknown type: {self.type}")
-        return ItemStringPB(
-            type=type,
-            id=self.id,
-            bonus=self.bonuses if self.bonuses else tuple(),
-            mods=self.mods if self.mods else tuple(),
-        )
+
+        proto.type = type
+        proto.id = self.id
+        if self.bonuses:
+            proto.bonus.extend(self.bonuses)
+        if self.mods:
+            proto.mods.extend(self.mods)
 
     @mods.validator
     def check_mods_even(cls, k, v) -> Optional[Tuple[int, ...]]:
@@ -763,9 +1324,20 @@ class ItemString:
 
         return v
 
+    # frozen, the same item string gets formatted over and over again when
+    # exporting. kept on the instance, a shared cache would keep every item string
+    # ever formatted alive (see `_INTERNED`) and hash it on every call.
     def to_str(self) -> str:
+        item_str = self._str
+        if item_str is None:
+            item_str = self._to_str()
+            object.__setattr__(self, "_str", item_str)
+
+        return item_str
+
+    def _to_str(self) -> str:
         # TODO: extensive testing
-        if self.mods and self.mods[0] in (e.value for e in ILVL_MODIFIERS_TYPES):
+        if self.mods and self.mods[0] in self._ILVL_MOD_KEYS:
             ilvl_key = self.mods[0]
             ilvl_val = self.mods[1]
             if ilvl_key == ILVL_MODIFIERS_TYPES.ABS_ILVL:
@@ -774,12 +1346,12 @@ class ItemString:
                 return f"{self.type}:{self.id}::{'+' if ilvl_val > 0 else ''}{ilvl_val}"
 
         if self.bonuses:
-            bonus_str = str(len(self.bonuses)) + ":" + ":".join(map(str, self.bonuses))
+            bonus_str = f"{len(self.bonuses)}:{':'.join(map(str, self.bonuses))}"
         else:
             bonus_str = None
 
         if self.mods:
-            mod_str = str(len(self.mods) // 2) + ":" + ":".join(map(str, self.mods))
+            mod_str = f"{len(self.mods) // 2}:{':'.join(map(str, self.mods))}"
         else:
             mod_str = None
 
@@ -847,7 +1419,6 @@ class MapItemStringMarketValueRecord(_RootDictMixin[ItemString, MarketValueRecor
         samples_s = 0
         samples_n = 0
         last_sample = None
-        # print()
         for price, price_quantity in price_groups:
             if (
                 last_sample
@@ -885,21 +1456,117 @@ class MapItemStringMarketValueRecord(_RootDictMixin[ItemString, MarketValueRecor
             samples_variance += (price - samples_mean) ** 2 * price_quantity
         ddof = 0 if samples_n == item_n else 1
         samples_std = (
-            np.sqrt(samples_variance / (samples_n - ddof)) if samples_n > 1 else 0
+            sqrt(samples_variance / (samples_n - ddof)) if samples_n > 1 else 0
         )
         samples_wstd = samples_std * cls.MAX_STD_MUL
 
         for price, price_quantity in samples:
-            if np.abs(price - samples_mean) > samples_wstd:
+            if abs(price - samples_mean) > samples_wstd:
                 samples_s -= price * price_quantity
                 samples_n -= price_quantity
 
         return samples_s / samples_n
 
     @classmethod
-    def _heap_pop_all(cls, heap: list) -> Generator[Tuple[int, int], None, None]:
-        while heap:
-            yield heappop(heap)
+    def calc_market_values(
+        cls,
+        item_ns: np.ndarray,
+        offsets: np.ndarray,
+        prices: np.ndarray,
+        quantities: np.ndarray,
+    ) -> np.ndarray:
+        """batched `calc_market_value` for many items at once.
+
+        integer price groups of all items are laid out back to back in `prices`
+        and `quantities`, item `i` owns `[offsets[i], offsets[i + 1])`, each
+        segment sorted by price and non-empty. returns the market value of each
+        item, NaN for items with an `item_ns` of 0 (`calc_market_value` gives None).
+        """
+        item_ns = np.asarray(item_ns, dtype=np.int64)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        prices = np.asarray(prices, dtype=np.int64)
+        quantities = np.asarray(quantities, dtype=np.int64)
+        n_items = len(item_ns)
+        starts = offsets[:-1]
+        segments = np.repeat(np.arange(n_items), np.diff(offsets))
+
+        lo = (item_ns * cls.SAMPLE_LO).astype(np.int64)[segments]
+        hi = (item_ns * cls.SAMPLE_HI).astype(np.int64)[segments]
+        n_sampled_after = np.cumsum(quantities)
+        n_sampled_after -= np.repeat(
+            n_sampled_after[starts] - quantities[starts], np.diff(offsets)
+        )
+        n_sampled_before = n_sampled_after - quantities
+
+        is_first = np.zeros(len(prices), dtype=bool)
+        is_first[starts] = True
+        prices_prev = np.roll(prices, 1)
+        # same stop conditions as `calc_market_value`, the first group
+        # of each item is always taken.
+        is_stop_before = ~is_first & (
+            (n_sampled_before >= lo)
+            & ((n_sampled_before >= hi) | (prices >= cls.MAX_JUMP_MUL * prices_prev))
+        )
+        is_stop_after = n_sampled_after > hi
+
+        # index of the first stop in each segment, segment end if none
+        index = np.arange(len(prices))
+        ends = offsets[1:]
+        i_stop_before = np.minimum(
+            np.minimum.reduceat(np.where(is_stop_before, index, len(prices)), starts),
+            ends,
+        )
+        i_stop_after = np.minimum(
+            np.minimum.reduceat(np.where(is_stop_after, index, len(prices)), starts),
+            ends,
+        )
+        is_trimmed = i_stop_before > i_stop_after
+        samples_end = np.where(is_trimmed, i_stop_after + 1, i_stop_before)
+
+        samples_q = quantities.copy()
+        # only take part of the last group so we have exactly `hi` samples,
+        # take at least 1 if it's the first group.
+        i_trimmed = i_stop_after[is_trimmed]
+        samples_q[i_trimmed] = np.maximum(
+            hi[i_trimmed] - n_sampled_before[i_trimmed], 1
+        )
+
+        is_sampled = index < samples_end[segments]
+        samples_p = prices[is_sampled]
+        samples_q = samples_q[is_sampled]
+        samples_seg = segments[is_sampled]
+        samples_starts = np.concatenate(([0], np.cumsum(samples_end - starts)[:-1]))
+
+        samples_n = np.add.reduceat(samples_q, samples_starts)
+        samples_s = np.add.reduceat(samples_p * samples_q, samples_starts)
+        with np.errstate(invalid="ignore"):
+            # 0 / 0 for items without quantity, NaN all the way to the end
+            samples_mean = samples_s / samples_n
+
+        samples_variance = np.add.reduceat(
+            (samples_p - samples_mean[samples_seg]) ** 2 * samples_q, samples_starts
+        )
+        ddof = np.where(samples_n == item_ns, 0, 1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            samples_std = np.where(
+                samples_n > 1, np.sqrt(samples_variance / (samples_n - ddof)), 0
+            )
+        samples_wstd = samples_std * cls.MAX_STD_MUL
+
+        is_kept = (
+            np.abs(samples_p - samples_mean[samples_seg]) <= samples_wstd[samples_seg]
+        )
+        kept_seg = samples_seg[is_kept]
+        kept_q = samples_q[is_kept]
+        kept_s = np.bincount(
+            kept_seg, weights=samples_p[is_kept] * kept_q, minlength=n_items
+        )
+        kept_n = np.bincount(kept_seg, weights=kept_q, minlength=n_items)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            market_values = kept_s / kept_n
+
+        market_values[item_ns == 0] = np.nan
+        return market_values
 
     @classmethod
     def from_response(
@@ -908,8 +1575,12 @@ class MapItemStringMarketValueRecord(_RootDictMixin[ItemString, MarketValueRecor
         game_version: GameVersionEnum = GameVersionEnum.RETAIL,
     ) -> "MapItemStringMarketValueRecord":
         obj = cls()
-        # >>> {item_string: [total_quantity, [(price, quantity), ...]]}
+        # >>> {item_string: [item_index, total_quantity, min_buyout]}
         temp = {}
+        # price groups of all items, flat, tagged by item index
+        group_items = []
+        group_prices = []
+        group_quantities = []
 
         for auction in response.get_auctions():
             item_string = ItemString.from_item(auction.get_item())
@@ -924,29 +1595,46 @@ class MapItemStringMarketValueRecord(_RootDictMixin[ItemString, MarketValueRecor
                 price = None if price is None else price // quantity
 
             if item_string not in temp:
-                # >>> [total_quantity, min_buyout, [(price, quantity), ...]]
-                temp[item_string] = [0, None, []]
+                temp[item_string] = [len(temp), 0, None]
 
-            temp[item_string][0] += quantity
-            if buyout is not None and (
-                temp[item_string][1] is None or buyout < temp[item_string][1]
-            ):
-                temp[item_string][1] = buyout
+            item = temp[item_string]
+            item[1] += quantity
+            if buyout is not None and (item[2] is None or buyout < item[2]):
+                item[2] = buyout
 
             # we're using bid as price for auctions without buyout
-            heappush(temp[item_string][2], (price, quantity))
+            group_items.append(item[0])
+            group_prices.append(price)
+            group_quantities.append(quantity)
 
-        for item_string in temp:
-            market_value = cls.calc_market_value(
-                temp[item_string][0], cls._heap_pop_all(temp[item_string][2])
-            )
-            if market_value:
+        if not temp:
+            return obj
+
+        # sort once for all items: by item, then by (price, quantity) within each
+        group_items = np.array(group_items, dtype=np.int64)
+        group_prices = np.array(group_prices, dtype=np.int64)
+        group_quantities = np.array(group_quantities, dtype=np.int64)
+        order = np.lexsort((group_quantities, group_prices, group_items))
+        offsets = np.zeros(len(temp) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(group_items, minlength=len(temp)))
+        item_ns = np.fromiter(
+            (item[1] for item in temp.values()), dtype=np.int64, count=len(temp)
+        )
+        market_values = cls.calc_market_values(
+            item_ns, offsets, group_prices[order], group_quantities[order]
+        )
+
+        timestamp = response.get_timestamp()
+        for item_string, (i, total_quantity, min_buyout) in temp.items():
+            market_value = market_values[i]
+            # NaN for items without any quantity, skipped like `None` used to be
+            if market_value and not np.isnan(market_value):
                 obj[item_string] = MarketValueRecord(
-                    timestamp=response.get_timestamp(),
+                    timestamp=timestamp,
                     market_value=market_value,
-                    num_auctions=temp[item_string][0],
+                    num_auctions=total_quantity,
                     # for auctions without buyout, their min_buyout are set 0
-                    min_buyout=temp[item_string][1] or 0,
+                    min_buyout=min_buyout or 0,
                 )
 
         return obj
@@ -962,18 +1650,25 @@ class MapItemStringMarketValueRecords(_RootDictMixin[ItemString, MarketValueReco
     """
 
     _logger: ClassVar[Logger] = getLogger("MapItemStringMarketValueRecords")
+    # items per `MarketValueRecords.batch_compute_market_values`, bounds the
+    # memory of the concatenated records
+    MARKET_VALUES_BATCH_SIZE: ClassVar[int] = 4096
+    # write records column-wise instead of the legacy row-wise records. readers
+    # from before the columns were added (remote mode pulls db files from the
+    # repo) see no records at all in such files, so this stays off until they
+    # are all migrated. either way each file holds only one of the two formats.
+    WRITE_COLUMNS: ClassVar[bool] = False
     __root__: Dict[ItemString, MarketValueRecords] = field(
-        default=Factory(partial(defaultdict, MarketValueRecords)),
-        alias="__root__",
+        default=Factory(dict), alias="__root__"
     )
-    _item_id_map: Dict[int, ItemString] = field(
+    _item_id_map: Dict[int, List[ItemString]] = field(
         init=False,
-        default=Factory(partial(defaultdict, list)),
+        default=Factory(dict),
         repr=False,
     )
-    _pet_id_map: Dict[int, ItemString] = field(
+    _pet_id_map: Dict[int, List[ItemString]] = field(
         init=False,
-        default=Factory(partial(defaultdict, list)),
+        default=Factory(dict),
         repr=False,
     )
     _indexed: bool = field(
@@ -988,11 +1683,14 @@ class MapItemStringMarketValueRecords(_RootDictMixin[ItemString, MarketValueReco
         """
         if self._indexed:
             return
+        id_maps = {
+            ItemStringTypeEnum.ITEM: self._item_id_map,
+            ItemStringTypeEnum.PET: self._pet_id_map,
+        }
         for item_string in self.keys():
-            if item_string.type == ItemStringTypeEnum.ITEM:
-                self._item_id_map[item_string.id].append(item_string)
-            elif item_string.type == ItemStringTypeEnum.PET:
-                self._pet_id_map[item_string.id].append(item_string)
+            id_map = id_maps.get(item_string.type)
+            if id_map is not None:
+                id_map.setdefault(item_string.id, []).append(item_string)
 
         self._indexed = True
 
@@ -1000,31 +1698,63 @@ class MapItemStringMarketValueRecords(_RootDictMixin[ItemString, MarketValueReco
     def query(self, id_: int) -> "MapItemStringMarketValueRecords":
         self._init_id_maps()
         result = MapItemStringMarketValueRecords()
-        if id_ in self._item_id_map and self._item_id_map[id_]:
-            for item_string in self._item_id_map[id_]:
-                result[item_string] = deepcopy(self[item_string])
-
-        if id_ in self._pet_id_map and self._pet_id_map[id_]:
-            for item_string in self._pet_id_map[id_]:
-                result[item_string] = deepcopy(self[item_string])
+        # `.get` so missing ids don't leave empty entries behind
+        for id_map in (self._item_id_map, self._pet_id_map):
+            for item_string in id_map.get(id_, ()):
+                # entries removed since indexing are skipped, not recreated empty
+                market_value_records = self.__root__.get(item_string)
+                if market_value_records is not None:
+                    result[item_string] = market_value_records.copy()
 
         return result
 
+    @classmethod
+    def union(
+        cls, *maps: "MapItemStringMarketValueRecords"
+    ) -> "MapItemStringMarketValueRecords":
+        """same records as `extend`-ing all `maps` in order into an empty map,
+        but items found in only one of the maps share its `MarketValueRecords`
+        instead of copying them, so the result is meant to be read only.
+        """
+        groups = {}
+        for map_ in maps:
+            for item_string, market_value_records in map_.items():
+                if market_value_records:
+                    groups.setdefault(item_string, []).append(market_value_records)
+
+        obj = cls()
+        for item_string, records_list in groups.items():
+            if len(records_list) == 1:
+                obj[item_string] = records_list[0]
+            else:
+                obj[item_string] = MarketValueRecords.concatenate(records_list)
+
+        return obj
+
     def extend(
         self, other: "MapItemStringMarketValueRecords", sort: bool = False
     ) -> Tuple[int, int]:
         n_added_records = 0
         n_added_entries = 0
-        for item_string, market_value_records in other.items():
-            for market_value_record in market_value_records:
-                n_added_records_, n_added_entries_ = self.add_market_value_record(
-                    item_string, market_value_record, sort=False
-                )
-                n_added_records += n_added_records_
-                n_added_entries += n_added_entries_
+        root = self.__root__
+        for item_string, market_value_records in other.__root__.items():
+            if not market_value_records:
+                continue
+
+            # whole columns at once, rather than a `MarketValueRecord` each
+            self_market_value_records = root.get(item_string)
+            if self_market_value_records is None:
+                self_market_value_records = MarketValueRecords()
+                root[item_string] = self_market_value_records
 
+            if not self_market_value_records:
+                n_added_entries += 1
+
+            self_market_value_records.extend(market_value_records)
+            n_added_records += len(market_value_records)
             if sort:
-                self[item_string].sort()
+                # once per item, `sort` is a no-op if the records stayed in order
+                self_market_value_records.sort()
 
         return n_added_records, n_added_entries
 
@@ -1044,6 +1774,17 @@ class MapItemStringMarketValueRecords(_RootDictMixin[ItemString, MarketValueReco
 
         return n_added_records, n_added_entries
 
+    def compute_market_values(self, ts_now: int) -> None:
+        """compute market values of all items ahead in batches, asking any item's
+        `compute_market_values(ts_now)` afterwards hits its cache.
+        """
+        records_list = list(self.values())
+        batch_size = self.MARKET_VALUES_BATCH_SIZE
+        for i in range(0, len(records_list), batch_size):
+            MarketValueRecords.batch_compute_market_values(
+                records_list[i : i + batch_size], ts_now
+            )
+
     def sort(self) -> None:
         # sort each MarketValueRecords in ascending order
         for market_value_records in self.values():
@@ -1059,11 +1800,14 @@ class MapItemStringMarketValueRecords(_RootDictMixin[ItemString, MarketValueReco
         if adding records in order of ascending timestamp, set `sort=False` to
         improve performance
         """
-        n_added_records = 0
-        n_added_entries = 0
-        if not self[item_string]:
-            n_added_entries += 1
-        n_added_records += self[item_string].add(market_value_record, sort=sort)
+        # one lookup, inserting explicitly rather than through the default factory
+        market_value_records = self.__root__.get(item_string)
+        if market_value_records is None:
+            market_value_records = MarketValueRecords()
+            self.__root__[item_string] = market_value_records
+
+        n_added_entries = 0 if market_value_records else 1
+        n_added_records = market_value_records.add(market_value_record, sort=sort)
         return n_added_records, n_added_entries
 
     def remove_expired(self, ts_expires: int) -> Tuple[int, int]:
@@ -1085,48 +1829,113 @@ class MapItemStringMarketValueRecords(_RootDictMixin[ItemString, MarketValueReco
         return n_removed
 
     def remove_empty_entries(self) -> int:
-        n_removed_entries = 0
-        for item_string in list(self.keys()):
-            if not self[item_string]:
-                self.pop(item_string)
-                n_removed_entries += 1
+        # collect first, then delete directly from the dict. rebuilding it instead
+        # would hash every kept item string again (python level `__hash__`).
+        root = self.__root__
+        empty_item_strings = [
+            item_string
+            for item_string, market_value_records in root.items()
+            # `_n` saves a `__len__` call per entry
+            if not market_value_records._n
+        ]
+        for item_string in empty_item_strings:
+            del root[item_string]
 
+        n_removed_entries = len(empty_item_strings)
         return n_removed_entries
 
     @classmethod
     def from_protobuf(cls, pb_item_db: ItemDB) -> "MapItemStringMarketValueRecords":
-        o = cls()
+        # gather the columns of all items, convert each to an array once and
+        # slice the items off of it, small per item conversions dominate otherwise
+        item_strings = []
+        lengths = []
+        ts, mv, na, mb = [], [], [], []
         for pb_item in pb_item_db.items:
-            market_value_records = MarketValueRecords()
-            for pb_item_mv_record in pb_item.market_value_records:
-                market_value_records.add(
-                    MarketValueRecord(
-                        timestamp=pb_item_mv_record.timestamp,
-                        market_value=pb_item_mv_record.market_value,
-                        num_auctions=pb_item_mv_record.num_auctions,
-                        min_buyout=pb_item_mv_record.min_buyout,
-                    ),
-                    sort=False,
-                )
-            item_string = ItemString.from_protobuf(pb_item.item_string)
-            o[item_string] = market_value_records
+            # columns win over the legacy records, files may have both
+            n = len(pb_item.timestamps)
+            if n:
+                ts.extend(pb_item.timestamps)
+                mv.extend(pb_item.market_values)
+                na.extend(pb_item.num_auctions)
+                mb.extend(pb_item.min_buyouts)
+            else:
+                # legacy row-wise records
+                for pb_item_mv_record in pb_item.market_value_records:
+                    ts.append(pb_item_mv_record.timestamp)
+                    mv.append(pb_item_mv_record.market_value)
+                    na.append(pb_item_mv_record.num_auctions)
+                    mb.append(pb_item_mv_record.min_buyout)
+                    n += 1
+
+            item_strings.append(ItemString.from_protobuf(pb_item.item_string))
+            lengths.append(n)
+
+        columns = [
+            np.array(column, dtype=dtype)
+            for column, dtype in zip((ts, mv, na, mb), MarketValueRecords.COLUMNS_DTYPE)
+        ]
+        ends = np.fromiter(accumulate(lengths), dtype=np.int64, count=len(lengths))
+        starts = ends - np.asarray(lengths, dtype=np.int64)
+        # times timestamps went back before each row, items are sorted if that
+        # doesn't change within their own rows
+        ts = columns[0]
+        n_backs = np.zeros(len(ts) + 1, dtype=np.int64)
+        np.cumsum(ts[1:] < ts[:-1], out=n_backs[2:])
+        is_sorted = n_backs[ends] == n_backs[np.minimum(starts + 1, ends)]
+        # items keep views of the shared columns, slices are disjoint and new rows
+        # go to fresh arrays once a slice is full
+        o = cls()
+        root = o.__root__
+        for item_string, start, end, is_sorted_ in zip(
+            item_strings, starts.tolist(), ends.tolist(), is_sorted.tolist()
+        ):
+            root[item_string] = MarketValueRecords._from_views(
+                *(column[start:end] for column in columns), is_sorted_
+            )
 
         return o
 
     def to_protobuf(self) -> ItemDB:
         pb_item_db = ItemDB()
-        for item_string, market_value_records in self.items():
-            if not market_value_records:
-                # skip empty entries
-                continue
+        # skip empty entries
+        items = [
+            (item_string, records) for item_string, records in self.items() if records
+        ]
+        if not items:
+            return pb_item_db
+
+        # convert each column of all items to a list once, like `from_protobuf`,
+        # small per item conversions dominate otherwise
+        ts, mv, na, mb = map(
+            np.concatenate, zip(*(records._get_columns() for _, records in items))
+        )
+        # NaN (None) is written as the field default, like unset fields
+        ts = ts.tolist()
+        na = na.tolist()
+        mv = np.nan_to_num(mv).astype(np.int64).tolist()
+        mb = np.nan_to_num(mb).astype(np.int64).tolist()
+        end = 0
+        for item_string, records in items:
+            start = end
+            end += len(records)
             pb_item = pb_item_db.items.add()
-            pb_item.item_string.CopyFrom(item_string.to_protobuf())
-            for mv_record in market_value_records:
-                pb_item_mv_record = pb_item.market_value_records.add()
-                pb_item_mv_record.timestamp = mv_record.timestamp
-                pb_item_mv_record.market_value = mv_record.market_value
-                pb_item_mv_record.num_auctions = mv_record.num_auctions
-                pb_item_mv_record.min_buyout = mv_record.min_buyout
+            item_string._fill_protobuf(pb_item.item_string)
+            if self.WRITE_COLUMNS:
+                # columns map onto packed repeated fields, one `extend` each
+                pb_item.timestamps.extend(ts[start:end])
+                pb_item.num_auctions.extend(na[start:end])
+                pb_item.market_values.extend(mv[start:end])
+                pb_item.min_buyouts.extend(mb[start:end])
+            else:
+                # assigning fields one by one is faster than `add(**fields)`
+                add_record = pb_item.market_value_records.add
+                for i in range(start, end):
+                    pb_record = add_record()
+                    pb_record.timestamp = ts[i]
+                    pb_record.market_value = mv[i]
+                    pb_record.num_auctions = na[i]
+                    pb_record.min_buyout = mb[i]
 
         return pb_item_db
 
@@ -1147,10 +1956,15 @@ class MapItemStringMarketValueRecords(_RootDictMixin[ItemString, MarketValueReco
         if not file.exists():
             raise FileNotFoundError(f"{file} not found.")
 
+        item_db = ItemDB()
         with file.open("rb") as f:
-            obj = cls.from_protobuf_bytes(f.read())
-            cls._logger.info(f"{file} loaded.")
-            return obj
+            # parse the read bytes in place, so they are released before the
+            # (much slower) conversion instead of living through it
+            item_db.ParseFromString(f.read())
+
+        obj = cls.from_protobuf(item_db)
+        cls._logger.info(f"{file} loaded.")
+        return obj
 
     def to_file(self, file: BinaryFile) -> None:
         with file.open("wb") as f:
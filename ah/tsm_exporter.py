@@ -1,5 +1,17 @@
-from typing import List, Set, Optional
-import argparse
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Set,
+    TextIO,
+    Tuple,
+    Union,
+)
+from functools import lru_cache
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
 import logging
 import sys
 import os
@@ -7,6 +19,7 @@ import os
 import numpy as np
 
 from ah.models import (
+    ItemString,
     MapItemStringMarketValueRecords,
     RegionEnum,
     Namespace,
@@ -92,12 +105,28 @@ class TSMExporter:
         'select(2, ...).LoadData("{data_type}","{region_or_realm}",[[return '
         "{{downloadTime={ts},fields={{{fields}}},data={{{data}}}}}]])"
     )
+    # the parts before and after `data`, rows are streamed in between
+    TEMPLATE_ROW_PREFIX = TEMPLATE_ROW.split("{data}")[0]
+    TEMPLATE_ROW_SUFFIX = TEMPLATE_ROW.split("{data}")[1].format()
     TEMPLATE_APPDATA = (
         'select(2, ...).LoadData("APP_INFO","Global",[[return '
         "{{version={version},lastSync={last_sync},"
         'message={{id=0,msg=""}},news={{}}}}]])'
     )
-    NUMERIC_SET = set("0123456789")
+    # numeric fields -> index into an item's stats in `export_append_data`:
+    # (*records.get_recent(), *records.compute_market_values())
+    FIELD_STATS = {
+        "numAuctions": 0,
+        "minBuyout": 1,
+        "marketValueRecent": 2,
+        "historical": 3,
+        "regionHistorical": 3,
+        "marketValue": 4,
+        "regionMarketValue": 4,
+    }
+    N_RECENT_STATS = 3
+    # items formatted at once, bounds the memory of a batch (see `_format_rows`)
+    EXPORT_BATCH_SIZE = 4096
     TSM_VERSION = 41200
     _logger = logging.getLogger("TSMExporter")
 
@@ -132,14 +161,102 @@ class TSMExporter:
 
     @classmethod
     def baseN(cls, num, b, numerals="0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"):
-        return ((num == 0) and numerals[0]) or (
-            cls.baseN(num // b, b, numerals).lstrip(numerals[0]) + numerals[num % b]
-        )
+        if num == 0:
+            return numerals[0]
+
+        digits = []
+        while num:
+            num, digit = divmod(num, b)
+            digits.append(numerals[digit])
+
+        return "".join(reversed(digits))
+
+    # digits of `baseN(num, 32)`, the only base TSM uses
+    _BASE32_NUMERALS = np.frombuffer(b"0123456789ABCDEFGHIJKLMNOPQRSTUV", np.uint8)
+    # 5 bits a digit, enough for any int64
+    _BASE32_MAX_DIGITS = 13
+
+    @classmethod
+    def _format_rows(cls, columns: List[Union[List[str], np.ndarray]]) -> str:
+        """`",".join("{c0,c1,...}" for each row)` of `columns`, each being either
+        the (ascii) texts of that column or an int64 array written in base 32.
+        the whole text is put together in one buffer, column by column, instead
+        of formatting the rows value by value.
+        """
+        n_rows = len(columns[0])
+        if not n_rows:
+            return ""
+
+        # bytes of the text columns, and the length of every cell
+        texts = {}
+        lens = []
+        for i, column in enumerate(columns):
+            if isinstance(column, np.ndarray):
+                n_digits = np.ones(n_rows, dtype=np.int64)
+                for n in range(1, cls._BASE32_MAX_DIGITS):
+                    n_digits += column >= 1 << 5 * n
+
+                lens.append(n_digits)
+            else:
+                texts[i] = np.frombuffer("".join(column).encode("ascii"), np.uint8)
+                lens.append(np.fromiter(map(len, column), np.int64, count=n_rows))
+
+        # "{" and a "," or "}" after every cell, rows are separated by ","
+        row_lens = 1 + sum(lens) + len(columns)
+        row_starts = np.zeros(n_rows, dtype=np.int64)
+        np.cumsum(row_lens[:-1] + 1, out=row_starts[1:])
+        buffer = np.full(row_starts[-1] + row_lens[-1], ord(","), dtype=np.uint8)
+        buffer[row_starts] = ord("{")
+        buffer[row_starts + row_lens - 1] = ord("}")
+        cell_starts = row_starts + 1
+        for i, (column, cell_lens) in enumerate(zip(columns, lens)):
+            if i in texts:
+                # every byte goes to its cell's start plus its offset in the cell
+                text_starts = np.zeros(n_rows, dtype=np.int64)
+                np.cumsum(cell_lens[:-1], out=text_starts[1:])
+                positions = np.repeat(cell_starts - text_starts, cell_lens)
+                positions += np.arange(len(texts[i]))
+                buffer[positions] = texts[i]
+            else:
+                # the n-th digit from the right of the cells that have it
+                cell_ends = cell_starts + cell_lens - 1
+                for n in range(cls._BASE32_MAX_DIGITS):
+                    has_digit = cell_lens > n
+                    if not has_digit.any():
+                        break
+
+                    digits = column[has_digit] >> 5 * n & 31
+                    buffer[cell_ends[has_digit] - n] = cls._BASE32_NUMERALS[digits]
+
+            cell_starts = cell_starts + cell_lens + 1
+
+        return buffer.tobytes().decode("ascii")
+
+    @classmethod
+    @lru_cache(maxsize=None)
+    def _get_export_plan(cls, fields: Tuple[str, ...]) -> Tuple:
+        """(fields_str, field_stats, stat_indices) of an export of
+        `fields`, exports are class constants so these are only worked out once
+        each.
+        """
+        # `None` for the item string
+        field_stats = []
+        for field in fields:
+            if field == "itemString":
+                field_stats.append(None)
+            elif field in cls.FIELD_STATS:
+                field_stats.append(cls.FIELD_STATS[field])
+            else:
+                raise ValueError(f"unsupported field {field}.")
+
+        fields_str = ",".join(f'"{field}"' for field in fields)
+        stat_indices = tuple(i for i in field_stats if i is not None)
+        return fields_str, tuple(field_stats), stat_indices
 
     @classmethod
     def export_append_data(
         cls,
-        file: TextFile,
+        file: Union[TextFile, TextIO],
         map_records: MapItemStringMarketValueRecords,
         fields: List[str],
         type_: str,
@@ -147,71 +264,154 @@ class TSMExporter:
         ts_update_begin: int,
         ts_update_end: int,
     ) -> None:
-        cls._logger.info(f"Exporting {type_} for {region_or_realm}...")
-        items_data = []
-        for item_string, records in map_records.items():
-            # tsm can handle:
-            # 1. numeral itemstring being string
-            # 2. 10-based numbers
-            item_data = []
-            # skip item if all numbers are 0 or None
-            is_skip_item = True
-            for field in fields:
-                if field == "minBuyout":
-                    value = records.get_recent_min_buyout(ts_update_begin)
-                    if value:
-                        is_skip_item = False
-                elif field == "numAuctions":
-                    value = records.get_recent_num_auctions(ts_update_begin)
-                    if value:
-                        is_skip_item = False
-                elif field == "marketValueRecent":
-                    value = records.get_recent_market_value(ts_update_begin)
-                    if value:
-                        is_skip_item = False
-                elif field in ["historical", "regionHistorical"]:
-                    value = records.get_historical_market_value(ts_update_end)
-                    if value:
-                        is_skip_item = False
-                elif field in ["marketValue", "regionMarketValue"]:
-                    value = records.get_weighted_market_value(ts_update_end)
-                    if value:
-                        is_skip_item = False
-                elif field == "itemString":
-                    value = item_string.to_str()
-                    if not set(value) < cls.NUMERIC_SET:
-                        value = '"' + value + '"'
-                else:
-                    raise ValueError(f"unsupported field {field}.")
-
-                if isinstance(value, (int, np.int32, np.int64)):
-                    value = cls.baseN(value, 32)
-                elif isinstance(value, float):
-                    value = str(value)
-                elif isinstance(value, str):
-                    pass
-                else:
-                    raise ValueError(f"unsupported type {type(value)}")
+        cls.export_append_data_batch(
+            file,
+            map_records,
+            [{"fields": fields, "type": type_}],
+            region_or_realm,
+            ts_update_begin,
+            ts_update_end,
+        )
 
-                item_data.append(value)
+    @classmethod
+    def export_append_data_batch(
+        cls,
+        file: Union[TextFile, TextIO],
+        map_records: MapItemStringMarketValueRecords,
+        exports: List[Dict[str, Any]],
+        region_or_realm: str,
+        ts_update_begin: int,
+        ts_update_end: int,
+    ) -> None:
+        """`export_append_data` of all `exports` (having "fields" and "type", like
+        `REALM_AUCTIONS_COMMODITIES_EXPORTS`) over the same `map_records` in one
+        pass, the first export is written as it goes, rows of the others are kept
+        until it's done.
+        """
+        # (prefix, suffix, field_stats, stat_indices) of each export
+        plans = []
+        for export in exports:
+            fields = export["fields"]
+            type_ = export["type"]
+            cls._logger.info(f"Exporting {type_} for {region_or_realm}...")
+            fields_str, field_stats, stat_indices = cls._get_export_plan(tuple(fields))
+            prefix = cls.TEMPLATE_ROW_PREFIX.format(
+                data_type=type_,
+                region_or_realm=region_or_realm,
+                ts=ts_update_begin,
+                fields=fields_str,
+            )
+            plans.append((prefix, cls.TEMPLATE_ROW_SUFFIX, field_stats, stat_indices))
+
+        if not plans:
+            return
+
+        stat_indices = {i for plan in plans for i in plan[3]}
+        is_recent_exported = any(i < cls.N_RECENT_STATS for i in stat_indices)
+        is_market_value_exported = any(i >= cls.N_RECENT_STATS for i in stat_indices)
+        if is_market_value_exported:
+            # all items at once, the loop below then reads them from the caches
+            map_records.compute_market_values(ts_update_end)
+
+        is_debug = cls._logger.isEnabledFor(logging.DEBUG)
+        # row texts of all exports but the first one
+        kept_texts = [[] for _ in plans[1:]]
+        with cls._open_export(file) as f:
+            f.write(plans[0][0])
+            sep = ""
+            for item_strings, stats_list in cls._iter_stats(
+                map_records,
+                ts_update_begin,
+                ts_update_end,
+                is_recent_exported,
+                is_market_value_exported,
+            ):
+                stats = np.array(stats_list, dtype=np.int64)
+                # tsm can handle:
+                # 1. numeral itemstring being string
+                # 2. 10-based numbers
+                # plain item ids are exported as numbers, everything else quoted
+                items = [
+                    item if item.isdigit() else f'"{item}"'
+                    for item in map(ItemString.to_str, item_strings)
+                ]
+                for i_plan, (_, _, field_stats, plan_stats) in enumerate(plans):
+                    # skip item if all numbers are 0, checked for the whole batch
+                    has_data = stats[:, plan_stats].any(axis=1)
+                    rows = np.flatnonzero(has_data)
+                    if is_debug and len(rows) < len(stats_list):
+                        for i in np.flatnonzero(~has_data):
+                            cls._logger.debug(
+                                "Skip item %s due to no data.", item_strings[i]
+                            )
+
+                    if not len(rows):
+                        continue
+
+                    text = cls._format_rows(
+                        [
+                            (
+                                [items[i] for i in rows]
+                                if stat is None
+                                else stats[rows, stat]
+                            )
+                            for stat in field_stats
+                        ]
+                    )
+                    if i_plan:
+                        kept_texts[i_plan - 1].append(text)
+                    else:
+                        f.write(sep + text)
+                        sep = ","
+
+            f.write(plans[0][1] + "\n")
+            for (prefix, suffix, _, _), texts in zip(plans[1:], kept_texts):
+                f.write(prefix)
+                f.write(",".join(texts))
+                f.write(suffix + "\n")
 
-            if is_skip_item:
-                cls._logger.debug(f"Skip item {item_string} due to no data.")
+    @classmethod
+    def _iter_stats(
+        cls,
+        map_records: MapItemStringMarketValueRecords,
+        ts_update_begin: int,
+        ts_update_end: int,
+        is_recent_exported: bool,
+        is_market_value_exported: bool,
+    ) -> Iterator[Tuple[List[ItemString], List[Tuple[int, ...]]]]:
+        """item strings and their stats (see `FIELD_STATS`) in batches of
+        `EXPORT_BATCH_SIZE`, leaving out items that can't have any data.
+        """
+        zeros = (0,) * cls.N_RECENT_STATS
+        item_strings = []
+        stats_list = []
+        for item_string, records in map_records.items():
+            if not is_market_value_exported and not records.has_data_since(
+                ts_update_begin
+            ):
+                # only recent fields, which are all 0 for stale items
                 continue
 
-            item_text = "{" + ",".join(item_data) + "}"
-            items_data.append(item_text)
+            if is_recent_exported:
+                # all recent fields come from the newest record, look it up once
+                stats = records.get_recent(ts_update_begin)
+            else:
+                stats = zeros
 
-        fields_str = ",".join('"' + field + '"' for field in fields)
-        text_out = cls.TEMPLATE_ROW.format(
-            data_type=type_,
-            region_or_realm=region_or_realm,
-            ts=ts_update_begin,
-            fields=fields_str,
-            data=",".join(items_data),
-        )
-        with file.open("a", newline="\n", encoding="utf-8") as f:
-            f.write(text_out + "\n")
+            if is_market_value_exported:
+                # both computed (and cached on `records`) at once, the historical
+                # and the weighted exports of a map each hit the cache this way.
+                stats += records.compute_market_values(ts_update_end)
+
+            item_strings.append(item_string)
+            stats_list.append(stats)
+            if len(item_strings) == cls.EXPORT_BATCH_SIZE:
+                yield item_strings, stats_list
+                item_strings = []
+                stats_list = []
+
+        if item_strings:
+            yield item_strings, stats_list
 
     def export_region(
         self,
@@ -235,6 +435,29 @@ class TSMExporter:
         if not export_realms <= all_realms:
             raise ValueError(f"unavailable realms : {export_realms - all_realms}. ")
 
+        # only opened once the export is known to be valid, an invalid one leaves
+        # the export file untouched
+        with self._open_export(self.export_file) as f:
+            self._export_region(
+                f,
+                namespace,
+                export_realms,
+                map_crid_connected_realms,
+                ts_update_start,
+                ts_update_end,
+            )
+
+    def _export_region(
+        self,
+        f: TextIO,
+        namespace: Namespace,
+        export_realms: Set[str],
+        map_crid_connected_realms: Dict[str, List[str]],
+        ts_update_start: int,
+        ts_update_end: int,
+    ):
+        # every loaded map is copied in column-wise right away, so each realm's
+        # map can be dropped before the next one is loaded
         region_auctions_commodities_data = MapItemStringMarketValueRecords()
 
         if namespace.game_version == GameVersionEnum.RETAIL:
@@ -247,7 +470,7 @@ class TSMExporter:
         if commodity_data:
             region_auctions_commodities_data.extend(commodity_data)
             self.export_append_data(
-                self.export_file,
+                f,
                 commodity_data,
                 self.COMMODITIES_EXPORT["fields"],
                 self.COMMODITIES_EXPORT["type"],
@@ -261,12 +484,13 @@ class TSMExporter:
         else:
             factions = [FactionEnum.ALLIANCE, FactionEnum.HORDE]
 
+        # (db file, faction, realm names) in the order of export
+        tasks = []
         for crid, connected_realms in map_crid_connected_realms.items():
             crid = int(crid)
-            connected_realms = set(connected_realms)
             # find all realm names we want to export under this connected realm,
             # they share the same auction data
-            sub_export_realms = export_realms & connected_realms
+            sub_export_realms = export_realms.intersection(connected_realms)
 
             for faction in factions:
                 db_file = self.db.get_file(
@@ -275,27 +499,47 @@ class TSMExporter:
                     crid=crid,
                     faction=faction,
                 )
-                auction_data = self.db.load_db(db_file)
+                tasks.append((db_file, faction, sub_export_realms))
+
+        # a background thread loads (or downloads in remote mode) the db files in
+        # order ahead of the exports, downloading and decompressing release the GIL
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            loaded = self._iter_prefetched(
+                executor, self.db.load_db, [task[0] for task in tasks]
+            )
+            for (db_file, faction, sub_export_realms), auction_data in zip(
+                tasks, loaded
+            ):
                 if not auction_data:
                     self._logger.warning(f"no data in {db_file}.")
                     continue
 
                 region_auctions_commodities_data.extend(auction_data)
+                if not sub_export_realms:
+                    # only needed for the region exports
+                    continue
+
                 if commodity_data:
-                    realm_auctions_commodities_data = MapItemStringMarketValueRecords()
-                    realm_auctions_commodities_data.extend(commodity_data)
-                    realm_auctions_commodities_data.extend(auction_data)
+                    # shares commodity records across realms rather than copying
+                    realm_auctions_commodities_data = (
+                        MapItemStringMarketValueRecords.union(
+                            commodity_data, auction_data
+                        )
+                    )
                 else:
                     realm_auctions_commodities_data = auction_data
 
+                # same for all realms under the connected realm
+                if faction is None:
+                    tsm_realm_suffix = ""
+                else:
+                    tsm_realm_suffix = f"-{faction.get_full_name()}"
+
                 for realm in sub_export_realms:
-                    if faction is None:
-                        tsm_realm = realm
-                    else:
-                        tsm_realm = f"{realm}-{faction.get_full_name()}"
+                    tsm_realm = realm + tsm_realm_suffix
 
                     self.export_append_data(
-                        self.export_file,
+                        f,
                         auction_data,
                         self.REALM_AUCTIONS_EXPORT["fields"],
                         self.REALM_AUCTIONS_EXPORT["type"],
@@ -303,55 +547,82 @@ class TSMExporter:
                         ts_update_start,
                         ts_update_end,
                     )
-                    for export_realm in self.REALM_AUCTIONS_COMMODITIES_EXPORTS:
-                        self.export_append_data(
-                            self.export_file,
-                            realm_auctions_commodities_data,
-                            export_realm["fields"],
-                            export_realm["type"],
-                            tsm_realm,
-                            ts_update_start,
-                            ts_update_end,
-                        )
-
-        if region_auctions_commodities_data:
-            for region_export in self.REGION_AUCTIONS_COMMODITIES_EXPORTS:
-                if (
-                    namespace.game_version
-                    in (
-                        GameVersionEnum.CLASSIC,
-                        GameVersionEnum.CLASSIC_WLK,
+                    self.export_append_data_batch(
+                        f,
+                        realm_auctions_commodities_data,
+                        self.REALM_AUCTIONS_COMMODITIES_EXPORTS,
+                        tsm_realm,
+                        ts_update_start,
+                        ts_update_end,
                     )
-                    and namespace.region == RegionEnum.TW
-                ):
-                    # TSM reconizes TW as KR in classic
-                    region = "KR"
-                else:
-                    region = namespace.region.upper()
 
-                tsm_game_version = namespace.game_version.get_tsm_game_version()
-                if tsm_game_version:
-                    tsm_region = f"{tsm_game_version}-{region}"
-                else:
-                    tsm_region = region
-
-                self.export_append_data(
-                    self.export_file,
-                    region_auctions_commodities_data,
-                    region_export["fields"],
-                    region_export["type"],
-                    tsm_region,
-                    ts_update_start,
-                    ts_update_end,
+        if region_auctions_commodities_data:
+            if (
+                namespace.game_version
+                in (
+                    GameVersionEnum.CLASSIC,
+                    GameVersionEnum.CLASSIC_WLK,
                 )
+                and namespace.region == RegionEnum.TW
+            ):
+                # TSM reconizes TW as KR in classic
+                region = "KR"
+            else:
+                region = namespace.region.upper()
+
+            tsm_game_version = namespace.game_version.get_tsm_game_version()
+            if tsm_game_version:
+                tsm_region = f"{tsm_game_version}-{region}"
+            else:
+                tsm_region = region
+
+            self.export_append_data_batch(
+                f,
+                region_auctions_commodities_data,
+                self.REGION_AUCTIONS_COMMODITIES_EXPORTS,
+                tsm_region,
+                ts_update_start,
+                ts_update_end,
+            )
 
-        self.export_append_app_info(self.export_file, self.TSM_VERSION, ts_update_end)
+        self.export_append_app_info(f, self.TSM_VERSION, ts_update_end)
 
     @classmethod
-    def export_append_app_info(cls, file: TextFile, version: int, ts_last_sync: int):
-        # mine windows uses cp936, let's be more explicit here
-        # https://docs.python.org/3.10/library/functions.html#open
-        with file.open("a", newline="\n", encoding="utf-8") as f:
+    def _iter_prefetched(
+        cls, executor: ThreadPoolExecutor, fn: Callable, args: List
+    ) -> Iterator:
+        """`map(fn, args)`, `fn` of the next argument runs in `executor` while the
+        current result is being used. unlike `executor.map`, only one call is
+        submitted ahead, so results aren't piling up in memory.
+        """
+        future = None
+        for arg in args:
+            next_future = executor.submit(fn, arg)
+            if future is not None:
+                yield future.result()
+
+            future = next_future
+
+        if future is not None:
+            yield future.result()
+
+    @classmethod
+    @contextmanager
+    def _open_export(cls, file: Union[TextFile, TextIO]) -> Iterator[TextIO]:
+        """`file` opened to append, or `file` itself if it's an open stream"""
+        if isinstance(file, TextFile):
+            # mine windows uses cp936, let's be more explicit here
+            # https://docs.python.org/3.10/library/functions.html#open
+            with file.open("a", newline="\n", encoding="utf-8") as f:
+                yield f
+        else:
+            yield file
+
+    @classmethod
+    def export_append_app_info(
+        cls, file: Union[TextFile, TextIO], version: int, ts_last_sync: int
+    ):
+        with cls._open_export(file) as f:
             text_out = cls.TEMPLATE_APPDATA.format(
                 version=version,
                 last_sync=ts_last_sync,
@@ -405,6 +676,9 @@ def main(
 
 
 def parse_args(raw_args):
+    # only needed from the command line, not when `main` is called directly
+    import argparse
+
     parser = argparse.ArgumentParser()
     default_db_path = config.DEFAULT_DB_PATH
     default_game_version = GameVersionEnum.RETAIL.name.lower()
@@ -319,13 +319,14 @@ class TestAuctionDB(TestCase):
             bonuses=None,
             mods=None,
         )
-        pick_map[new_item_string].add(
+        pick_map.add_market_value_record(
+            new_item_string,
             MarketValueRecord(
                 timestamp=ts_base + n_record_per_item,
                 market_value=1,
                 num_auctions=1,
                 min_buyout=1,
-            )
+            ),
         )
         pick_map.to_file(pick_file)
         self.assertEqual(len(pick_map), n_item + 1)
@@ -0,0 +1,177 @@
+from unittest import TestCase, mock
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import TemporaryDirectory
+from io import StringIO
+from random import Random
+import re
+
+import numpy as np
+
+from ah.models import (
+    ItemString,
+    ItemStringTypeEnum,
+    MapItemStringMarketValueRecords,
+    MarketValueRecord,
+    MarketValueRecords,
+    Namespace,
+    NameSpaceCategoriesEnum,
+    GameVersionEnum,
+    RegionEnum,
+)
+from ah.storage import TextFile
+from ah.defs import SECONDS_IN
+from ah.tsm_exporter import TSMExporter
+
+
+class TestExporter(TestCase):
+    def test_format_rows(self):
+        values = [0, 1, 31, 32, 1023, 1024, 32**5 - 1, 32**5, 123456789, 2**62]
+        items = [str(i) if i % 2 else f'"i:{i}::1:2"' for i in range(len(values))]
+        texts = TSMExporter._format_rows(
+            [np.array(values), items, np.array(values[::-1])]
+        )
+        self.assertEqual(
+            texts,
+            ",".join(
+                "{%s,%s,%s}"
+                % (TSMExporter.baseN(a, 32), item, TSMExporter.baseN(b, 32))
+                for a, item, b in zip(values, items, values[::-1])
+            ),
+        )
+        self.assertEqual(TSMExporter._format_rows([[], np.array([])]), "")
+
+    @classmethod
+    def reference_market_values(cls, records, ts_now):
+        """(historical, weighted) of `records` in any order, one record at a time"""
+        n_days = max(
+            MarketValueRecords.HISTORICAL_DAYS, len(MarketValueRecords.DAY_WEIGHTS)
+        )
+        buckets = [[] for _ in range(n_days)]
+        for record in records:
+            day = (ts_now - record.timestamp - 1) // SECONDS_IN.DAY
+            if record.market_value is not None and 0 <= day < n_days:
+                buckets[day].append(record.market_value)
+
+        # oldest day first
+        days_average = [
+            int(sum(bucket) / len(bucket) + 0.5) if bucket else None
+            for bucket in reversed(buckets)
+        ]
+        historical = [
+            avg
+            for avg in days_average[-MarketValueRecords.HISTORICAL_DAYS :]
+            if avg is not None
+        ]
+        weighted = [
+            (avg, weight)
+            for avg, weight in zip(
+                days_average[-len(MarketValueRecords.DAY_WEIGHTS) :],
+                MarketValueRecords.DAY_WEIGHTS,
+            )
+            if avg is not None
+        ]
+        sum_weights = sum(weight for _, weight in weighted)
+        return (
+            int(sum(historical) / len(historical) + 0.5) if historical else 0,
+            (
+                int(sum(avg * weight for avg, weight in weighted) / sum_weights + 0.5)
+                if sum_weights
+                else 0
+            ),
+        )
+
+    def test_export_union(self):
+        ts_now = SECONDS_IN.DAY * 100
+        rng = Random(0)
+        maps = []
+        for i_map in range(3):
+            map_ = MapItemStringMarketValueRecords()
+            # items 10 to 19 are in every map, the rest only in one of them
+            for id_ in (*range(10, 20), *range(100 * i_map, 100 * i_map + 5)):
+                item_string = ItemString(
+                    type=ItemStringTypeEnum.ITEM, id=id_, bonuses=None, mods=None
+                )
+                timestamps = sorted(
+                    rng.randint(ts_now - SECONDS_IN.DAY * 70, ts_now + 100)
+                    for _ in range(rng.randint(1, 30))
+                )
+                for ts in timestamps:
+                    map_.add_market_value_record(
+                        item_string,
+                        MarketValueRecord(
+                            timestamp=ts,
+                            market_value=rng.choice([None, rng.randint(1, 10**6)]),
+                            num_auctions=1,
+                            min_buyout=None,
+                        ),
+                    )
+
+            maps.append(map_)
+
+        union = MapItemStringMarketValueRecords.union(*maps)
+        self.assertFalse(all(records._sorted for records in union.values()))
+        f = StringIO()
+        TSMExporter.export_append_data_batch(
+            f,
+            union,
+            TSMExporter.REGION_AUCTIONS_COMMODITIES_EXPORTS,
+            "US",
+            ts_now,
+            ts_now,
+        )
+        # one line per export, "regionMarketValue" then "regionHistorical"
+        exported = [
+            {
+                int(item): int(value, 32)
+                for item, value in re.findall(r"{(\d+),(\w+)}", line)
+            }
+            for line in f.getvalue().splitlines()
+        ]
+        expected = [{}, {}]
+        for item_string, records in union.items():
+            historical, weighted = self.reference_market_values(records, ts_now)
+            for values, value in zip(expected, (weighted, historical)):
+                if value:
+                    values[item_string.id] = value
+
+        self.assertEqual(exported, expected)
+
+    def test_iter_prefetched(self):
+        calls = []
+
+        def load(arg):
+            calls.append(arg)
+            return arg * 10
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            loaded = TSMExporter._iter_prefetched(executor, load, [1, 2, 3, 4])
+            self.assertEqual(next(loaded), 10)
+            # at most the next one is loaded ahead, not all of them
+            self.assertLessEqual(len(calls), 2)
+            self.assertEqual(list(loaded), [20, 30, 40])
+
+        self.assertEqual(calls, [1, 2, 3, 4])
+        self.assertEqual(list(TSMExporter._iter_prefetched(None, load, [])), [])
+
+    def test_export_region_invalid(self):
+        namespace = Namespace(
+            category=NameSpaceCategoriesEnum.DYNAMIC,
+            game_version=GameVersionEnum.RETAIL,
+            region=RegionEnum.US,
+        )
+        meta = {
+            "update": {"start_ts": 1000, "end_ts": 2000},
+            "connected_realms": {"1": ["realm_a", "realm_b"]},
+        }
+        for meta_, export_realms in [(None, {"realm_a"}), (meta, {"realm_c"})]:
+            db = mock.Mock()
+            db.load_meta.return_value = meta_
+            with TemporaryDirectory() as temp:
+                export_file = TextFile(f"{temp}/AppData.lua")
+                exporter = TSMExporter(db, export_file)
+                self.assertRaises(
+                    ValueError, exporter.export_region, namespace, export_realms
+                )
+                # nothing to export, the export file is never opened
+                self.assertFalse(export_file.exists())
+                db.load_db.assert_not_called()
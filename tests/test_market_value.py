@@ -1,5 +1,7 @@
 from unittest import TestCase
-from ah.models import MapItemStringMarketValueRecord
+import math
+
+from ah.models import CommoditiesResponse, MapItemStringMarketValueRecord
 
 
 class TestMarketValue(TestCase):
@@ -77,3 +79,56 @@ class TestMarketValue(TestCase):
         expected = 1
         actual = MapItemStringMarketValueRecord.calc_market_value(7, price_groups)
         self.assertAlmostEqual(expected, actual)
+
+    def test_market_value_calc_batch(self):
+        items = [
+            (24, [(5, 1), (13, 2), (15, 3), (16, 1), (17, 2), (19, 1), (20, 6)]),
+            (2, [(10, 1), (100, 1)]),
+            (1, [(4, 1)]),
+            (7, [(1, 1), (2, 6)]),
+            (30, [(100, 10), (101, 10), (200, 10)]),
+        ]
+        offsets = [0]
+        prices = []
+        quantities = []
+        for _, price_groups in items:
+            offsets.append(offsets[-1] + len(price_groups))
+            prices.extend(price for price, _ in price_groups)
+            quantities.extend(quantity for _, quantity in price_groups)
+
+        actual = MapItemStringMarketValueRecord.calc_market_values(
+            [item_n for item_n, _ in items], offsets, prices, quantities
+        )
+        for (item_n, price_groups), market_value in zip(items, actual):
+            expected = MapItemStringMarketValueRecord.calc_market_value(
+                item_n, price_groups
+            )
+            self.assertAlmostEqual(expected, market_value)
+
+    def test_market_value_calc_batch_zero_quantity(self):
+        # an item whose auctions all have 0 quantity has no market value
+        actual = MapItemStringMarketValueRecord.calc_market_values(
+            [1, 0, 2], [0, 1, 2, 3], [10, 20, 30], [1, 0, 2]
+        )
+        self.assertIsNone(MapItemStringMarketValueRecord.calc_market_value(0, []))
+        self.assertEqual(actual[0], 10)
+        self.assertTrue(math.isnan(actual[1]))
+        self.assertEqual(actual[2], 30)
+
+        response = CommoditiesResponse.parse_obj(
+            {
+                "auctions": [
+                    {
+                        "id": i,
+                        "item": {"id": item_id},
+                        "quantity": quantity,
+                        "unit_price": 100,
+                        "time_left": "VERY_LONG",
+                    }
+                    for i, (item_id, quantity) in enumerate([(1, 2), (2, 0)])
+                ]
+            }
+        )
+        increment = MapItemStringMarketValueRecord.from_response(response)
+        self.assertEqual([item_string.id for item_string in increment], [1])
+        self.assertEqual(list(increment.values())[0].market_value, 100)
@@ -1,5 +1,7 @@
 from unittest import TestCase
+import gc
 import random
+import weakref
 
 from ah.models import (
     ItemString,
@@ -181,6 +183,42 @@ class TestModels(TestCase):
         self.assertEqual(item_string.mods, None)
         self.assertEqual(item_string.to_str(), f"p:{item_string.id}")
 
+    def test_item_string_interned(self):
+        bonus_in, _ = self.mock_bonuses()
+        modifiers_in, _ = self.mock_modifiers()
+        item = AuctionItem(
+            id=1000,
+            context=0,
+            bonus_lists=bonus_in,
+            modifiers=modifiers_in,
+        )
+        item_string = ItemString.from_item(item)
+        self.assertIs(item_string, ItemString.from_item(item))
+        self.assertIsNot(
+            item_string, ItemString.from_item(AuctionItem(id=1001, context=0))
+        )
+        # instances made directly are equal, but not pooled
+        item_string2 = ItemString(
+            type=item_string.type,
+            id=item_string.id,
+            bonuses=item_string.bonuses,
+            mods=item_string.mods,
+        )
+        self.assertEqual(item_string, item_string2)
+        self.assertIsNot(item_string, item_string2)
+
+        # formatting is cached on the instance, doesn't affect equality or keep
+        # pooled instances alive
+        item_str = item_string.to_str()
+        self.assertIs(item_string.to_str(), item_str)
+        self.assertEqual(item_string2.to_str(), item_str)
+        self.assertEqual(item_string, item_string2)
+        self.assertEqual(hash(item_string), hash(item_string2))
+        ref = weakref.ref(item_string)
+        del item_string
+        gc.collect()
+        self.assertIsNone(ref())
+
     def test_item_level(self):
         bonuses, mods = [8851, 8852, 8801], [
             {"type": 28, "value": 2164},
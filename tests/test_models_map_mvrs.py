@@ -1,4 +1,4 @@
-from unittest import TestCase
+from unittest import TestCase, mock
 from tests.test_models_mvrs import TestModels as TestModelsMVRs
 
 from ah.models import (
@@ -10,6 +10,7 @@ from ah.models import (
     ItemStringTypeEnum,
 )
 from ah.defs import SECONDS_IN
+from ah.protobuf.item_db_pb2 import ItemDB
 
 
 class TestModels(TestCase):
@@ -51,7 +52,9 @@ class TestModels(TestCase):
         self.assertEqual(nr_rec, 7)
         self.assertEqual(len(db), 0)
         self.assertNotIn(item_string, db)
-        self.assertEqual(len(db[item_string]), 0)
+        # missing items aren't created on lookup
+        self.assertRaises(KeyError, db.__getitem__, item_string)
+        self.assertNotIn(item_string, db)
 
     def test_sort(self):
         N_ITEMS = 10
@@ -182,6 +185,119 @@ class TestModels(TestCase):
 
         self.assertEqual(len(db1), 150)
 
+    def test_union(self):
+        db1 = MapItemStringMarketValueRecords()
+        db2 = MapItemStringMarketValueRecords()
+        for db, ids, ts in ((db1, range(100), 1), (db2, range(50, 150), 2)):
+            for i in ids:
+                db.add_market_value_record(
+                    ItemString(
+                        type=ItemStringTypeEnum.ITEM,
+                        id=i,
+                        bonuses=None,
+                        mods=None,
+                    ),
+                    MarketValueRecord(
+                        timestamp=ts,
+                        market_value=100,
+                        num_auctions=100,
+                        min_buyout=1,
+                    ),
+                )
+
+        union = MapItemStringMarketValueRecords.union(db1, db2)
+        expected = MapItemStringMarketValueRecords()
+        expected.extend(db1)
+        expected.extend(db2)
+        self.assertEqual(list(union.keys()), list(expected.keys()))
+        for item_string, records in union.items():
+            self.assertEqual(records, expected[item_string])
+            if item_string.id < 50:
+                self.assertIs(records, db1[item_string])
+            elif item_string.id >= 100:
+                self.assertIs(records, db2[item_string])
+            else:
+                # overlapping items are concatenated, sources left untouched
+                self.assertEqual([r.timestamp for r in records], [1, 2])
+                self.assertEqual(len(db1[item_string]), 1)
+                self.assertEqual(len(db2[item_string]), 1)
+
+        # newer map first, overlapping items are flagged as unsorted
+        union = MapItemStringMarketValueRecords.union(db2, db1)
+        for item_string, records in union.items():
+            self.assertEqual(records._sorted, not 50 <= item_string.id < 100)
+
+    def test_protobuf(self):
+        db = MapItemStringMarketValueRecords()
+        legacy = ItemDB()
+        for i in range(10):
+            item_string = ItemString(
+                type=ItemStringTypeEnum.ITEM,
+                id=i,
+                bonuses=None,
+                mods=None,
+            )
+            pb_item = legacy.items.add()
+            pb_item.item_string.CopyFrom(item_string.to_protobuf())
+            for ts in range(i + 1):
+                db.add_market_value_record(
+                    item_string,
+                    MarketValueRecord(
+                        timestamp=ts,
+                        market_value=100 + ts,
+                        num_auctions=i,
+                        min_buyout=1,
+                    ),
+                )
+                pb_item.market_value_records.add(
+                    timestamp=ts,
+                    market_value=100 + ts,
+                    num_auctions=i,
+                    min_buyout=1,
+                )
+
+        # records are written row-wise for older readers, in only one format
+        pb_item_db = db.to_protobuf()
+        self.assertEqual(pb_item_db, legacy)
+
+        with mock.patch.object(MapItemStringMarketValueRecords, "WRITE_COLUMNS", True):
+            columns_only = db.to_protobuf()
+        for pb_item in columns_only.items:
+            self.assertEqual(len(pb_item.timestamps), pb_item.item_string.id + 1)
+            self.assertEqual(len(pb_item.market_value_records), 0)
+
+        # both the columns and legacy row-wise records are read
+        for pb in (columns_only, legacy):
+            db_ = MapItemStringMarketValueRecords.from_protobuf(pb)
+            self.assertEqual(list(db_.keys()), list(db.keys()))
+            for item_string, records in db.items():
+                self.assertEqual(db_[item_string], records)
+                self.assertTrue(db_[item_string]._sorted)
+
+        # missing values are written as 0, the field default
+        db_ = MapItemStringMarketValueRecords()
+        db_.add_market_value_record(
+            item_string,
+            MarketValueRecord(
+                timestamp=1, market_value=None, num_auctions=1, min_buyout=None
+            ),
+        )
+        pb_record = db_.to_protobuf().items[0].market_value_records[0]
+        self.assertEqual((pb_record.market_value, pb_record.min_buyout), (0, 0))
+        with mock.patch.object(MapItemStringMarketValueRecords, "WRITE_COLUMNS", True):
+            pb_item = db_.to_protobuf().items[0]
+        self.assertEqual(list(pb_item.market_values), [0])
+        self.assertEqual(list(pb_item.min_buyouts), [0])
+
+        # items share the loaded columns, changing one leaves the others alone
+        db_ = MapItemStringMarketValueRecords.from_protobuf(pb_item_db)
+        item_strings = list(db_.keys())
+        db_[item_strings[3]].append(db_[item_strings[3]][0])
+        db_[item_strings[4]].pop(0)
+        db_[item_strings[5]][0] = db_[item_strings[5]][-1]
+        for item_string in item_strings[:3] + item_strings[6:]:
+            self.assertEqual(db_[item_string], db[item_string])
+
     def test_update_increment(self):
         increment = MapItemStringMarketValueRecord(
             __root__={
@@ -271,6 +387,11 @@ class TestModels(TestCase):
             for rec in recs:
                 self.assertEqual(rec.market_value, 100)
 
+        # query results are copies
+        for item, recs in db_.items():
+            recs.add(recs[0])
+            self.assertEqual(len(db[item]), 1)
+
     def assert_compression(
         self,
         records: MarketValueRecords,
@@ -1,6 +1,7 @@
 from unittest import TestCase
 from math import gcd
 from copy import deepcopy
+from random import Random
 
 from ah.models import (
     MarketValueRecord,
@@ -130,14 +131,62 @@ class TestModels(TestCase):
         # disrupt the order
         size = len(records)
         records.__root__ = records.__root__[size // 2 :] + records.__root__[: size // 2]
-        wmv_false = records.get_weighted_market_value(NOW)
-        self.assertNotEqual(wmv, wmv_false)
+        # records know they're out of order, the value doesn't change
+        self.assertFalse(records._sorted)
+        wmv_unsorted = records.get_weighted_market_value(NOW)
+        self.assertEqual(wmv, wmv_unsorted)
 
         # sort
         records.sort()
         wmv_true = records.get_weighted_market_value(NOW)
         self.assertEqual(wmv, wmv_true)
 
+    def test_add_sorted(self):
+        records = MarketValueRecords()
+        timestamps = [5, 3, 9, 3, 0, 7, 9, 1]
+        for i, ts in enumerate(timestamps):
+            records.add(
+                MarketValueRecord(
+                    timestamp=ts,
+                    market_value=i,
+                    num_auctions=100,
+                    min_buyout=1,
+                ),
+                sort=True,
+            )
+
+        # in order, records of equal timestamps in the order they were added
+        self.assertEqual(
+            [(record.timestamp, record.market_value) for record in records],
+            sorted(
+                ((ts, i) for i, ts in enumerate(timestamps)),
+                key=lambda pair: pair[0],
+            ),
+        )
+
+    def test_extend(self):
+        def make_records(timestamps):
+            return MarketValueRecords.from_columns(
+                timestamps,
+                [10 * ts for ts in timestamps],
+                [1] * len(timestamps),
+                [None] * len(timestamps),
+            )
+
+        records = make_records([1, 2])
+        records.extend(make_records([3, 4]))
+        self.assertEqual(records, make_records([1, 2, 3, 4]))
+        self.assertTrue(records._sorted)
+
+        records.extend(MarketValueRecords())
+        self.assertEqual(len(records), 4)
+
+        records.extend(make_records([0]))
+        self.assertEqual(records, make_records([1, 2, 3, 4, 0]))
+        self.assertFalse(records._sorted)
+        records.sort()
+        self.assertEqual(records, make_records([0, 1, 2, 3, 4]))
+
     def test_recent(self):
         records = MarketValueRecords()
         record_list = (
@@ -155,6 +204,10 @@ class TestModels(TestCase):
         self.assertEqual(records.get_recent_market_value(9), 90)
         self.assertEqual(records.get_recent_num_auctions(9), 900)
         self.assertEqual(records.get_recent_min_buyout(9), 9000)
+        self.assertTrue(records.has_data_since(9))
+        self.assertFalse(records.has_data_since(10))
+        self.assertEqual(records.get_recent(10), (0, 0, 0))
+        self.assertFalse(MarketValueRecords().has_data_since(0))
 
     def test_historical(self):
         # average mv of 60 days, first average by day then by 60 days
@@ -238,6 +291,149 @@ class TestModels(TestCase):
             int(weight_lcm * N_DAYS / sum(MarketValueRecords.DAY_WEIGHTS) + 0.5),
         )
 
+    def test_compute_market_values(self):
+        N_DAYS = MarketValueRecords.HISTORICAL_DAYS + 10
+        records = MarketValueRecords()
+        for i in range(N_DAYS * 3):
+            records.add(
+                MarketValueRecord(
+                    timestamp=i * SECONDS_IN.DAY // 3,
+                    # leave a gap every 4 days
+                    market_value=None if (i // 3) % 4 == 0 else 100 + i * 10,
+                    num_auctions=100,
+                    min_buyout=10,
+                ),
+                sort=False,
+            )
+
+        for NOW in (0, SECONDS_IN.DAY * 20 + 1, SECONDS_IN.DAY * N_DAYS):
+            # getters first, `compute_market_values` caches its result
+            expected = (
+                records.get_historical_market_value(NOW),
+                records.get_weighted_market_value(NOW),
+            )
+            self.assertEqual(records.compute_market_values(NOW), expected)
+            self.assertEqual(records.compute_market_values(NOW), expected)
+
+        # cache is dropped when records change
+        records.add(
+            MarketValueRecord(
+                timestamp=NOW - 1,
+                market_value=100_000,
+                num_auctions=100,
+                min_buyout=10,
+            )
+        )
+        self.assertNotEqual(records.compute_market_values(NOW), expected)
+        self.assertEqual(
+            records.get_weighted_market_value(NOW),
+            records.compute_market_values(NOW)[1],
+        )
+
+        records.empty()
+        self.assertEqual(records.compute_market_values(SECONDS_IN.DAY), (0, 0))
+
+    def test_batch_compute_market_values(self):
+        N_DAYS = MarketValueRecords.HISTORICAL_DAYS + 10
+        NOW = SECONDS_IN.DAY * N_DAYS
+        records_list = []
+        for n_records in (0, 1, 7, N_DAYS * 3):
+            records = MarketValueRecords()
+            for i in range(n_records):
+                records.add(
+                    MarketValueRecord(
+                        timestamp=NOW - (n_records - i) * SECONDS_IN.DAY // 3,
+                        market_value=None if i % 5 == 0 else 100 + i * 7,
+                        num_auctions=100,
+                        min_buyout=10,
+                    )
+                )
+            records_list.append(records)
+
+        # out of order records are batched as well
+        record_list = records.__root__
+        Random(0).shuffle(record_list)
+        records_list.append(MarketValueRecords(__root__=record_list))
+        self.assertFalse(records_list[-1]._sorted)
+
+        expected = [
+            records.copy().compute_market_values(NOW) for records in records_list
+        ]
+        MarketValueRecords.batch_compute_market_values(records_list, NOW)
+        for records, market_values in zip(records_list, expected):
+            if records:
+                # left in the cache by the batch
+                self.assertEqual(records._market_values_cache, (NOW, market_values))
+            self.assertEqual(records.compute_market_values(NOW), market_values)
+
+        # cached for another `ts_now`, computed again in the batch
+        ts_before = NOW - SECONDS_IN.DAY
+        expected = [
+            records.copy().compute_market_values(ts_before) for records in records_list
+        ]
+        MarketValueRecords.batch_compute_market_values(records_list, ts_before)
+        for records, market_values in zip(records_list, expected):
+            if records:
+                self.assertEqual(
+                    records._market_values_cache, (ts_before, market_values)
+                )
+
+    def test_columns(self):
+        records = MarketValueRecords()
+        for i in range(100):
+            records.add(
+                MarketValueRecord(
+                    timestamp=i,
+                    market_value=None if i % 10 == 0 else 10 * i,
+                    num_auctions=100 * i,
+                    min_buyout=1000 * i,
+                ),
+                sort=False,
+            )
+
+        self.assertEqual(len(records), 100)
+        self.assertIsNone(records[0].market_value)
+        self.assertEqual(records[-1].market_value, 990)
+        self.assertEqual(records[-1].min_buyout, 99000)
+        self.assertEqual([r.timestamp for r in records], list(range(100)))
+        with self.assertRaises(IndexError):
+            records[100]
+
+        # records are copies, modifying them doesn't change the stored ones
+        records[1].market_value = 1
+        self.assertEqual(records[1].market_value, 10)
+        record = records[1]
+        record.market_value = 1
+        records[1] = record
+        self.assertEqual(records[1].market_value, 1)
+
+        record = records.pop(0)
+        self.assertEqual(record.timestamp, 0)
+        self.assertEqual(len(records), 99)
+        self.assertEqual(records[0].timestamp, 1)
+
+        records_ = MarketValueRecords(__root__=records.__root__)
+        self.assertEqual(records, records_)
+        records_.add(records[0])
+        self.assertNotEqual(records, records_)
+        records_.sort()
+        self.assertEqual(records_[0].timestamp, records_[1].timestamp)
+
+        # out of order writes get sorted
+        records_[0] = MarketValueRecord(
+            timestamp=1000, market_value=1, num_auctions=1, min_buyout=1
+        )
+        records_.sort()
+        self.assertEqual(records_[-1].timestamp, 1000)
+        records_.add(
+            MarketValueRecord(
+                timestamp=-1, market_value=1, num_auctions=1, min_buyout=1
+            ),
+            sort=True,
+        )
+        self.assertEqual(records_[0].timestamp, -1)
+        self.assertEqual(records_[-1].timestamp, 1000)
+
     def test_expired(self):
         records = MarketValueRecords()
         record_list = (
@@ -282,6 +478,39 @@ class TestModels(TestCase):
         records.remove_expired(100)
         self.assertEqual(len(records), 0)
 
+        # out of order records are all checked
+        for i in (5, 1, 8, 0, 3):
+            records.add(
+                MarketValueRecord(
+                    timestamp=i,
+                    market_value=10 * i,
+                    num_auctions=100 * i,
+                    min_buyout=1000 * i,
+                ),
+                sort=False,
+            )
+        self.assertEqual(records.remove_expired(4), 3)
+        self.assertEqual([record.timestamp for record in records], [5, 8])
+
+    def test_compress_unsorted(self):
+        ts_now = SECONDS_IN.DAY * 30 + 100
+        ts_expires_in = SECONDS_IN.DAY * 10
+        records, expected_compressed, expected_recent = self.generate_records(
+            ts_now, ts_expires_in
+        )
+        # same records, out of order
+        record_list = records.__root__
+        Random(0).shuffle(record_list)
+        records = MarketValueRecords(__root__=record_list)
+        self.assertFalse(records._sorted)
+
+        records.compress(ts_now, ts_expires_in)
+        records.sort()
+        self.assertEqual(
+            records,
+            MarketValueRecords(__root__=[*expected_compressed, *expected_recent]),
+        )
+
     @classmethod
     def generate_records(
         cls,
@@ -169,10 +169,12 @@ class TestWorkflow(TestCase):
         item_string = ItemString(
             type=ItemStringTypeEnum.ITEM, id=item_id, bonuses=None, mods=None
         )
-        item_records = map_item_string_records[item_string]
-        self.assertEqual(expected_number_of_records, len(item_records))
-
-        if expected_number_of_records:
+        if not expected_number_of_records:
+            # no entry is created for an item without records
+            self.assertNotIn(item_string, map_item_string_records)
+        else:
+            item_records = map_item_string_records[item_string]
+            self.assertEqual(expected_number_of_records, len(item_records))
             record = item_records[0]
             self.assertEqual(timestamp, record.timestamp)
             self.assertEqual(expected_mv, record.market_value)